@@ -0,0 +1,198 @@
+"""
+Benchmarks of the per-frame hot paths, without hardware: the null device backend and
+stub metric backends stand in for the cooler and the sensors.
+
+    python benchmarks/run_benchmarks.py -o results.json
+    python benchmarks/run_benchmarks.py --compare results.json --threshold 0.2
+
+Every result is the median and min time per call in microseconds over --repeat runs.
+With --compare, benchmarks whose min time per call (the least noisy of the two) is slower
+than the baseline by more than threshold are reported and the script exits with status 1.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import timeit
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(repo_root, "src"))
+
+import numpy as np
+from config import NUMBER_OF_LEDS, display_modes_small
+from controller import Controller
+from display_modes import display_mode_registry
+from metrics import Metrics
+
+spec_types = {
+    "static": "ff0000",
+    "random": "random",
+    "gradient_seconds": "ff0000-0000ff-seconds",
+    "gradient_metric": "ff0000-0000ff-cpu_temp",
+    "multi_stop": "cpu_temp;00ff00:30;ffff00:60;ff0000:90",
+    "cycle": "ff0000-00ff00-0000ff-ffff00",
+    "wave_ltr": "wave_ltr;ff0000-00ff00-0000ff",
+    "wave_rtl": "wave_rtl;ff0000-00ff00-0000ff",
+}
+
+stub_values = {"cpu_temp": 55, "gpu_temp": 62, "cpu_usage": 37, "gpu_usage": 81}
+
+
+def stub_candidates():
+    return {metric: [("stub", lambda value=value: value)] for metric, value in stub_values.items()}
+
+
+def bench(function, repeat):
+    """Median and min microseconds per call, the number of calls per run is picked by timeit."""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    runs = sorted(total / number * 1e6 for total in timer.repeat(repeat=repeat, number=number))
+    return {"median_us": round(runs[len(runs) // 2], 3), "min_us": round(runs[0], 3), "calls": number}
+
+
+def bench_colors(controller, config, repeat):
+    results = {}
+    metrics = dict(stub_values)
+    renderer = controller.renderer
+    contexts = {f"colors.{name}": [spec] * NUMBER_OF_LEDS for name, spec in spec_types.items()}
+    for key in ("metrics", "time"):
+        contexts[f"colors.config_{key}"] = config.get(key, {}).get("colors", ["ffe000"] * NUMBER_OF_LEDS)
+    for name, colors in contexts.items():
+        bench_config = {"metrics": {"colors": colors}}
+        renderer.color_plans["metrics"] = renderer.compile_color_plan(bench_config, "metrics")
+        results[name] = bench(lambda: controller.get_config_colors(bench_config, "metrics", metrics), repeat)
+    renderer.color_plans.pop("metrics")
+    results["colors.compile_config_metrics"] = bench(lambda: renderer.compile_color_plan(config, "metrics"), repeat)
+    # The config did not change, drop the renderer so that its plans are rebuilt
+    controller.renderer = None
+    controller.apply_config(config)
+    return results
+
+
+def bench_encode(controller, repeat):
+    results = {}
+    controller.keepalive_interval = 1e9  # Unchanged frames are never resent
+    controller.send_packets()
+    results["encode.send_packets_unchanged"] = bench(controller.send_packets, repeat)
+    frames = [np.zeros((NUMBER_OF_LEDS, 3), dtype=np.uint8), np.full((NUMBER_OF_LEDS, 3), 255, dtype=np.uint8)]
+    state = {"frame": 0}
+    def changed():
+        state["frame"] += 1
+        controller.frame = frames[state["frame"] % 2]
+        controller.send_packets()
+    results["encode.send_packets_changed"] = bench(changed, repeat)
+    return results
+
+
+def bench_modes(controller, config, repeat):
+    results = {}
+    for name in display_mode_registry:
+        mode_config = dict(config, display_mode=name, layout_mode="small" if name in display_modes_small else "big")
+        controller.apply_config(mode_config)
+        controller.config_watcher.changed = lambda: False  # Keeps the mode config
+        def frame():
+            controller.update()
+            controller.send_packets()
+        results[f"mode.{name}"] = bench(frame, repeat)
+        del controller.config_watcher.changed
+    return results
+
+
+def bench_metrics(metrics, repeat):
+    results = {}
+    temp_unit = {"cpu": "celsius", "gpu": "fahrenheit"}
+    metrics.update_interval = 1e9
+    metrics.refresh()
+    results["metrics.get_metrics_cached"] = bench(lambda: metrics.get_metrics(temp_unit), repeat)
+    metrics.update_interval = 0
+    results["metrics.get_metrics_refresh"] = bench(lambda: metrics.get_metrics(temp_unit), repeat)
+    results["metrics.refresh"] = bench(metrics.refresh, repeat)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=repo_root, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(config_path, repeat):
+    with open(config_path, "r") as f:
+        config = json.load(f)
+    # The stub backends make the GPU vendor irrelevant, none avoids creating the NVML/nvidia-smi backends
+    bench_config = dict(config, gpu_vendor="none", idle_mode=False, device_backend="null")
+    with tempfile.TemporaryDirectory() as tmp:
+        bench_config_path = os.path.join(tmp, "config.json")
+        with open(bench_config_path, "w") as f:
+            json.dump(bench_config, f)
+        os.environ["DIGITAL_LCD_CONFIG"] = bench_config_path
+        metrics = Metrics(candidates=stub_candidates())
+        controller = Controller(config_path=bench_config_path, metrics=metrics)
+        # Samples inline in get_metrics(), so the sampler thread does not compete with the timings
+        metrics.stop()
+        try:
+            results = {}
+            results.update(bench_colors(controller, bench_config, repeat))
+            results.update(bench_encode(controller, repeat))
+            results.update(bench_modes(controller, bench_config, repeat))
+            results.update(bench_metrics(metrics, repeat))
+        finally:
+            controller.close()
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "commit": git_commit(),
+            "config": os.path.abspath(config_path),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(report, baseline, threshold):
+    """Prints the change of every benchmark against the baseline, returns the names of the regressions."""
+    regressions = []
+    for name, result in report["results"].items():
+        before = baseline["results"].get(name)
+        if before is None or not before["min_us"]:
+            print(f"{name:45} {result['min_us']:12.3f} us  (new)")
+            continue
+        ratio = result["min_us"] / before["min_us"]
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:45} {result['min_us']:12.3f} us  {ratio - 1:+8.1%}{flag}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks the render, encode and metrics hot paths with a mock device.")
+    parser.add_argument("--config", default=os.path.join(repo_root, "config.json"), help="Config to benchmark, defaults to the repo config.json")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark (default 5)")
+    parser.add_argument("-o", "--output", help="Write the results as JSON to this file instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="Results JSON of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Relative slowdown of the min time reported as a regression (default 0.2)")
+    args = parser.parse_args()
+
+    report = run(args.config, args.repeat)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+    elif not args.compare:
+        print(json.dumps(report, indent=4))
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
@@ -22,6 +22,34 @@ if ! command -v jq &> /dev/null; then
     exit 1
 fi
 
+# The running controller takes config changes on its control socket: it applies them at once
+# and saves them to the config file itself. When it is not running, the file is rewritten.
+CONTROL="$SCRIPT_DIR/src/control_socket.py"
+
+controller_running() {
+    python3 "$CONTROL" --config "$CONFIG_FILE" get &> /dev/null
+}
+
+# Prints the config, from the controller when it is running since the file can be behind it
+current_config() {
+    python3 "$CONTROL" --config "$CONFIG_FILE" get 2> /dev/null || cat "$CONFIG_FILE"
+}
+
+# Applies a jq filter, with its jq options before it, to the config. Only the top-level keys
+# that changed are sent to the controller.
+update_config() {
+    local current new status
+    if current=$(python3 "$CONTROL" --config "$CONFIG_FILE" get 2> /dev/null); then
+        new=$(echo "$current" | jq "$@") || return 1
+        python3 "$CONTROL" --config "$CONFIG_FILE" patch \
+            "$(jq -n -c --argjson old "$current" --argjson new "$new" '$new | with_entries(select(.value != $old[.key]))')"
+        status=$?
+        # 3: the controller stopped in the meantime
+        [ "$status" -ne 3 ] && return "$status"
+    fi
+    jq "$@" "$CONFIG_FILE" > "${CONFIG_FILE}.tmp" && mv "${CONFIG_FILE}.tmp" "$CONFIG_FILE"
+}
+
 # Function to display the main menu
 show_main_menu() {
     clear
@@ -99,7 +127,7 @@ change_display_mode() {
             ;;
     esac
 
-    jq --arg mode "$mode" '.display_mode = $mode' "$CONFIG_FILE" > "${CONFIG_FILE}.tmp" && mv "${CONFIG_FILE}.tmp" "$CONFIG_FILE"
+    update_config --arg mode "$mode" '.display_mode = $mode'
     echo -e "${GREEN}Display mode changed to: $mode${NC}"
     sleep 2
 }
@@ -175,11 +203,11 @@ set_all_leds_color() {
     local json_color_array=$(printf "\"%s\"," $(for i in $(seq 1 84); do echo $color; done) | sed 's/.$//')
 
     if [ "$context" = "both" ] || [ "$context" = "metrics" ]; then
-        jq --argjson colors "[$json_color_array]" '.metrics.colors = $colors' "$CONFIG_FILE" > "${CONFIG_FILE}.tmp" && mv "${CONFIG_FILE}.tmp" "$CONFIG_FILE"
+        update_config --argjson colors "[$json_color_array]" '.metrics.colors = $colors'
     fi
 
     if [ "$context" = "both" ] || [ "$context" = "time" ]; then
-        jq --argjson colors "[$json_color_array]" '.time.colors = $colors' "$CONFIG_FILE" > "${CONFIG_FILE}.tmp" && mv "${CONFIG_FILE}.tmp" "$CONFIG_FILE"
+        update_config --argjson colors "[$json_color_array]" '.time.colors = $colors'
     fi
 
     echo -e "${GREEN}All LEDs set to color: #$color${NC}"
@@ -193,12 +221,17 @@ set_led_range_color() {
     local color=$3
     local context=$4
 
-    local current_colors=$(jq -r ".${context}.colors | @json" "$CONFIG_FILE")
+    if controller_running; then
+        python3 "$CONTROL" --config "$CONFIG_FILE" set-colors "$context" "$start" "$end" "$color"
+        return
+    fi
+
+    local current_colors=$(current_config | jq -r ".${context}.colors | @json")
 
     # Create new colors array with updated range
-    local new_colors=$(echo "$current_colors" | jq --arg color "$color" --argjson start "$start" --argjson end "$end" '
+    local new_colors=$(echo "$current_colors" | jq --arg color "$color" --argjson start "$start" --argjson last "$end" '
         to_entries | map(
-            if .key >= $start and .key <= $end then
+            if .key >= $start and .key <= $last then
                 .value = $color
             else
                 .
@@ -206,7 +239,7 @@ set_led_range_color() {
         ) | map(.value)
     ')
 
-    jq --argjson colors "$new_colors" ".${context}.colors = \$colors" "$CONFIG_FILE" > "${CONFIG_FILE}.tmp" && mv "${CONFIG_FILE}.tmp" "$CONFIG_FILE"
+    update_config --argjson colors "$new_colors" ".${context}.colors = \$colors"
 }
 
 # Function to set metric-based color gradients
@@ -254,21 +287,8 @@ set_metric_gradient() {
         return
     fi
 
-    # Get current colors array
-    local current_colors=$(jq -r '.metrics.colors' "$CONFIG_FILE")
-
     # Update only the specific LED range for this metric
-    local updated_colors=$(echo "$current_colors" | jq --arg gradient "$gradient_string" --argjson start "$start_led" --argjson end "$end_led" '
-        to_entries | map(
-            if .key >= $start and .key <= $end then
-                .value = $gradient
-            else
-                .
-            end
-        ) | map(.value)
-    ')
-
-    jq --argjson colors "$updated_colors" '.metrics.colors = $colors' "$CONFIG_FILE" > "${CONFIG_FILE}.tmp" && mv "${CONFIG_FILE}.tmp" "$CONFIG_FILE"
+    set_led_range_color "$start_led" "$end_led" "$gradient_string" metrics
 
     echo -e "${GREEN}Metric-based gradient applied for $metric (LEDs $start_led-$end_led)${NC}"
     sleep 2
@@ -313,11 +333,11 @@ change_led_colors() {
             local json_array=$(for i in $(seq 1 84); do echo -n "\"${gradient}\","; done | sed 's/.$//')
 
             if [ "$context" = "both" ] || [ "$context" = "metrics" ]; then
-                jq --argjson colors "[$json_array]" '.metrics.colors = $colors' "$CONFIG_FILE" > "${CONFIG_FILE}.tmp" && mv "${CONFIG_FILE}.tmp" "$CONFIG_FILE"
+                update_config --argjson colors "[$json_array]" '.metrics.colors = $colors'
             fi
 
             if [ "$context" = "both" ] || [ "$context" = "time" ]; then
-                jq --argjson colors "[$json_array]" '.time.colors = $colors' "$CONFIG_FILE" > "${CONFIG_FILE}.tmp" && mv "${CONFIG_FILE}.tmp" "$CONFIG_FILE"
+                update_config --argjson colors "[$json_array]" '.time.colors = $colors'
             fi
 
             echo -e "${GREEN}Gradient applied: $color1 → $color2${NC}"
@@ -336,11 +356,11 @@ change_led_colors() {
             local json_array=$(for i in $(seq 1 84); do echo -n "\"random\","; done | sed 's/.$//')
 
             if [ "$context" = "both" ] || [ "$context" = "metrics" ]; then
-                jq --argjson colors "[$json_array]" '.metrics.colors = $colors' "$CONFIG_FILE" > "${CONFIG_FILE}.tmp" && mv "${CONFIG_FILE}.tmp" "$CONFIG_FILE"
+                update_config --argjson colors "[$json_array]" '.metrics.colors = $colors'
             fi
 
             if [ "$context" = "both" ] || [ "$context" = "time" ]; then
-                jq --argjson colors "[$json_array]" '.time.colors = $colors' "$CONFIG_FILE" > "${CONFIG_FILE}.tmp" && mv "${CONFIG_FILE}.tmp" "$CONFIG_FILE"
+                update_config --argjson colors "[$json_array]" '.time.colors = $colors'
             fi
 
             echo -e "${GREEN}Random colors applied${NC}"
@@ -374,7 +394,7 @@ change_led_colors() {
             gradient="${color1}-${color2}-${time_unit}"
             local json_array=$(for i in $(seq 1 84); do echo -n "\"${gradient}\","; done | sed 's/.$//')
 
-            jq --argjson colors "[$json_array]" '.time.colors = $colors' "$CONFIG_FILE" > "${CONFIG_FILE}.tmp" && mv "${CONFIG_FILE}.tmp" "$CONFIG_FILE"
+            update_config --argjson colors "[$json_array]" '.time.colors = $colors'
 
             echo -e "${GREEN}Time-based gradient applied (${time_unit})${NC}"
             sleep 2
@@ -445,8 +465,8 @@ color_presets() {
 
     local json_color_array=$(printf "\"%s\"," $(for i in $(seq 1 84); do echo $color; done) | sed 's/.$//')
 
-    jq --argjson colors "[$json_color_array]" '.metrics.colors = $colors' "$CONFIG_FILE" > "${CONFIG_FILE}.tmp" && mv "${CONFIG_FILE}.tmp" "$CONFIG_FILE"
-    jq --argjson colors "[$json_color_array]" '.time.colors = $colors' "$CONFIG_FILE" > "${CONFIG_FILE}.tmp" && mv "${CONFIG_FILE}.tmp" "$CONFIG_FILE"
+    update_config --argjson colors "[$json_color_array]" '.metrics.colors = $colors'
+    update_config --argjson colors "[$json_color_array]" '.time.colors = $colors'
 
     echo -e "${GREEN}All LEDs set to color: #$color${NC}"
     sleep 2
@@ -460,8 +480,8 @@ configure_temperature() {
     echo -e "${CYAN}╚═══════════════════════════════════════════════════════╝${NC}"
     echo ""
 
-    current_cpu_unit=$(jq -r '.cpu_temperature_unit' "$CONFIG_FILE")
-    current_gpu_unit=$(jq -r '.gpu_temperature_unit' "$CONFIG_FILE")
+    current_cpu_unit=$(current_config | jq -r '.cpu_temperature_unit')
+    current_gpu_unit=$(current_config | jq -r '.gpu_temperature_unit')
 
     echo -e "Current CPU unit: ${YELLOW}$current_cpu_unit${NC}"
     echo -e "Current GPU unit: ${YELLOW}$current_gpu_unit${NC}"
@@ -480,10 +500,10 @@ configure_temperature() {
             echo "Select unit: (1) Celsius (2) Fahrenheit"
             read -p "Choice: " unit_choice
             if [ "$unit_choice" = "1" ]; then
-                jq '.cpu_temperature_unit = "celsius"' "$CONFIG_FILE" > "${CONFIG_FILE}.tmp" && mv "${CONFIG_FILE}.tmp" "$CONFIG_FILE"
+                update_config '.cpu_temperature_unit = "celsius"'
                 echo -e "${GREEN}CPU temperature unit set to Celsius${NC}"
             elif [ "$unit_choice" = "2" ]; then
-                jq '.cpu_temperature_unit = "fahrenheit"' "$CONFIG_FILE" > "${CONFIG_FILE}.tmp" && mv "${CONFIG_FILE}.tmp" "$CONFIG_FILE"
+                update_config '.cpu_temperature_unit = "fahrenheit"'
                 echo -e "${GREEN}CPU temperature unit set to Fahrenheit${NC}"
             fi
             sleep 2
@@ -492,10 +512,10 @@ configure_temperature() {
             echo "Select unit: (1) Celsius (2) Fahrenheit"
             read -p "Choice: " unit_choice
             if [ "$unit_choice" = "1" ]; then
-                jq '.gpu_temperature_unit = "celsius"' "$CONFIG_FILE" > "${CONFIG_FILE}.tmp" && mv "${CONFIG_FILE}.tmp" "$CONFIG_FILE"
+                update_config '.gpu_temperature_unit = "celsius"'
                 echo -e "${GREEN}GPU temperature unit set to Celsius${NC}"
             elif [ "$unit_choice" = "2" ]; then
-                jq '.gpu_temperature_unit = "fahrenheit"' "$CONFIG_FILE" > "${CONFIG_FILE}.tmp" && mv "${CONFIG_FILE}.tmp" "$CONFIG_FILE"
+                update_config '.gpu_temperature_unit = "fahrenheit"'
                 echo -e "${GREEN}GPU temperature unit set to Fahrenheit${NC}"
             fi
             sleep 2
@@ -506,10 +526,9 @@ configure_temperature() {
             read -p "GPU min temp: " gpu_min
             read -p "GPU max temp: " gpu_max
 
-            jq --argjson cpu_min "$cpu_min" --argjson cpu_max "$cpu_max" \
+            update_config --argjson cpu_min "$cpu_min" --argjson cpu_max "$cpu_max" \
                --argjson gpu_min "$gpu_min" --argjson gpu_max "$gpu_max" \
-               '.cpu_min_temp = $cpu_min | .cpu_max_temp = $cpu_max | .gpu_min_temp = $gpu_min | .gpu_max_temp = $gpu_max' \
-               "$CONFIG_FILE" > "${CONFIG_FILE}.tmp" && mv "${CONFIG_FILE}.tmp" "$CONFIG_FILE"
+               '.cpu_min_temp = $cpu_min | .cpu_max_temp = $cpu_max | .gpu_min_temp = $gpu_min | .gpu_max_temp = $gpu_max'
 
             echo -e "${GREEN}Temperature ranges updated${NC}"
             sleep 2
@@ -526,9 +545,9 @@ configure_intervals() {
     echo -e "${CYAN}╚═══════════════════════════════════════════════════════╝${NC}"
     echo ""
 
-    current_update=$(jq -r '.update_interval' "$CONFIG_FILE")
-    current_metrics=$(jq -r '.metrics_update_interval' "$CONFIG_FILE")
-    current_cycle=$(jq -r '.cycle_duration' "$CONFIG_FILE")
+    current_update=$(current_config | jq -r '.update_interval')
+    current_metrics=$(current_config | jq -r '.metrics_update_interval')
+    current_cycle=$(current_config | jq -r '.cycle_duration')
 
     echo -e "Current update interval: ${YELLOW}${current_update}s${NC}"
     echo -e "Current metrics update interval: ${YELLOW}${current_metrics}s${NC}"
@@ -539,9 +558,8 @@ configure_intervals() {
     read -p "New metrics update interval (seconds): " metrics_interval
     read -p "New cycle duration (seconds): " cycle_duration
 
-    jq --argjson update "$update_interval" --argjson metrics "$metrics_interval" --argjson cycle "$cycle_duration" \
-       '.update_interval = $update | .metrics_update_interval = $metrics | .cycle_duration = $cycle' \
-       "$CONFIG_FILE" > "${CONFIG_FILE}.tmp" && mv "${CONFIG_FILE}.tmp" "$CONFIG_FILE"
+    update_config --argjson update "$update_interval" --argjson metrics "$metrics_interval" --argjson cycle "$cycle_duration" \
+       '.update_interval = $update | .metrics_update_interval = $metrics | .cycle_duration = $cycle'
 
     echo -e "${GREEN}Update intervals configured${NC}"
     sleep 2
@@ -573,7 +591,7 @@ quick_presets() {
 
     case $choice in
         1)
-            jq '.display_mode = "peerless_standard"' "$CONFIG_FILE" > "${CONFIG_FILE}.tmp" && mv "${CONFIG_FILE}.tmp" "$CONFIG_FILE"
+            update_config '.display_mode = "peerless_standard"'
             # Set CPU temp-based colors for CPU section, GPU temp-based for GPU section
             set_led_range_color 0 41 "00ff00-ff0000-cpu_temp" "metrics"
             set_led_range_color 42 83 "0000ff-ff0000-gpu_temp" "metrics"
@@ -582,7 +600,7 @@ quick_presets() {
         2)
             local gradient="ff0000-ffff00-00ff00-00ffff-0000ff-ff00ff-ff0000"
             local json_array=$(for i in $(seq 1 84); do echo -n "\"${gradient}\","; done | sed 's/.$//')
-            jq --argjson colors "[$json_array]" '.metrics.colors = $colors | .time.colors = $colors' "$CONFIG_FILE" > "${CONFIG_FILE}.tmp" && mv "${CONFIG_FILE}.tmp" "$CONFIG_FILE"
+            update_config --argjson colors "[$json_array]" '.metrics.colors = $colors | .time.colors = $colors'
             echo -e "${GREEN}RGB Rainbow preset applied${NC}"
             ;;
         3)
@@ -598,7 +616,7 @@ quick_presets() {
         5)
             local gradient="ff0000-ff8800"
             local json_array=$(for i in $(seq 1 84); do echo -n "\"${gradient}\","; done | sed 's/.$//')
-            jq --argjson colors "[$json_array]" '.metrics.colors = $colors | .time.colors = $colors' "$CONFIG_FILE" > "${CONFIG_FILE}.tmp" && mv "${CONFIG_FILE}.tmp" "$CONFIG_FILE"
+            update_config --argjson colors "[$json_array]" '.metrics.colors = $colors | .time.colors = $colors'
             echo -e "${GREEN}Fire Theme preset applied${NC}"
             ;;
         6)
@@ -674,13 +692,13 @@ quick_presets() {
         10)
             local gradient="wave_ltr;ff0000-ffff00-00ff00-00ffff-0000ff-ff00ff-ff0000"
             local json_array=$(for i in $(seq 1 84); do echo -n "\"${gradient}\","; done | sed 's/.$//')
-            jq --argjson colors "[$json_array]" '.metrics.colors = $colors | .time.colors = $colors' "$CONFIG_FILE" > "${CONFIG_FILE}.tmp" && mv "${CONFIG_FILE}.tmp" "$CONFIG_FILE"
+            update_config --argjson colors "[$json_array]" '.metrics.colors = $colors | .time.colors = $colors'
             echo -e "${GREEN}Wave L-to-R preset applied${NC}"
             ;;
         11)
             local gradient="wave_rtl;ff0000-ffff00-00ff00-00ffff-0000ff-ff00ff-ff0000"
             local json_array=$(for i in $(seq 1 84); do echo -n "\"${gradient}\","; done | sed 's/.$//')
-            jq --argjson colors "[$json_array]" '.metrics.colors = $colors | .time.colors = $colors' "$CONFIG_FILE" > "${CONFIG_FILE}.tmp" && mv "${CONFIG_FILE}.tmp" "$CONFIG_FILE"
+            update_config --argjson colors "[$json_array]" '.metrics.colors = $colors | .time.colors = $colors'
             echo -e "${GREEN}Wave R-to-L preset applied${NC}"
             ;;
         0) return ;;
@@ -699,17 +717,19 @@ view_config() {
     echo -e "${CYAN}╚═══════════════════════════════════════════════════════╝${NC}"
     echo ""
 
-    echo -e "${YELLOW}Display Mode:${NC} $(jq -r '.display_mode' "$CONFIG_FILE")"
-    echo -e "${YELLOW}Layout Mode:${NC} $(jq -r '.layout_mode' "$CONFIG_FILE")"
-    echo -e "${YELLOW}CPU Temperature Unit:${NC} $(jq -r '.cpu_temperature_unit' "$CONFIG_FILE")"
-    echo -e "${YELLOW}GPU Temperature Unit:${NC} $(jq -r '.gpu_temperature_unit' "$CONFIG_FILE")"
-    echo -e "${YELLOW}Update Interval:${NC} $(jq -r '.update_interval' "$CONFIG_FILE")s"
-    echo -e "${YELLOW}Metrics Update Interval:${NC} $(jq -r '.metrics_update_interval' "$CONFIG_FILE")s"
-    echo -e "${YELLOW}Cycle Duration:${NC} $(jq -r '.cycle_duration' "$CONFIG_FILE")s"
+    echo -e "${YELLOW}Display Mode:${NC} $(current_config | jq -r '.display_mode')"
+    echo -e "${YELLOW}Layout Mode:${NC} $(current_config | jq -r '.layout_mode')"
+    echo -e "${YELLOW}CPU Temperature Unit:${NC} $(current_config | jq -r '.cpu_temperature_unit')"
+    echo -e "${YELLOW}GPU Temperature Unit:${NC} $(current_config | jq -r '.gpu_temperature_unit')"
+    echo -e "${YELLOW}Update Interval:${NC} $(current_config | jq -r '.update_interval')s"
+    echo -e "${YELLOW}Metrics Update Interval:${NC} $(current_config | jq -r '.metrics_update_interval')s"
+    echo -e "${YELLOW}Cycle Duration:${NC} $(current_config | jq -r '.cycle_duration')s"
+    echo -e "${YELLOW}Keepalive Interval:${NC} $(current_config | jq -r '.keepalive_interval // 1.0')s"
+    echo -e "${YELLOW}Idle Mode:${NC} $(current_config | jq -r 'if .idle_mode == null then true else .idle_mode end')"
     echo ""
     echo -e "${YELLOW}Temperature Ranges:${NC}"
-    echo -e "  CPU: $(jq -r '.cpu_min_temp' "$CONFIG_FILE")°C - $(jq -r '.cpu_max_temp' "$CONFIG_FILE")°C"
-    echo -e "  GPU: $(jq -r '.gpu_min_temp' "$CONFIG_FILE")°C - $(jq -r '.gpu_max_temp' "$CONFIG_FILE")°C"
+    echo -e "  CPU: $(current_config | jq -r '.cpu_min_temp')°C - $(current_config | jq -r '.cpu_max_temp')°C"
+    echo -e "  GPU: $(current_config | jq -r '.gpu_min_temp')°C - $(current_config | jq -r '.gpu_max_temp')°C"
     echo ""
 
     read -p "Press Enter to continue..."
@@ -0,0 +1,142 @@
+import datetime
+import numpy as np
+from config import metric_names
+from utils import hex_to_rgb
+from gradient_lut import LookupGroup, linear_lut, metric_lut, metric_domain, stops_lut, stops_domain, cycle_lut, CYCLE_LUT_SIZE
+
+time_units = ["seconds", "minutes", "hours"]
+time_lut_sizes = [60, 60, 24]
+time_unit_seconds = [1, 60, 3600]
+
+
+class ColorPlan:
+    """
+    The color specs of one config context ("metrics" or "time"), parsed once.
+    LEDs are grouped by spec kind and every gradient is a precomputed lookup table,
+    so that each frame is a handful of array ops instead of re-parsing every color string.
+    """
+    def __init__(self, specs, metrics_min_value, metrics_max_value):
+        self.specs = list(specs)
+        self.metrics_min_value = dict(metrics_min_value)
+        self.metrics_max_value = dict(metrics_max_value)
+        self.number_of_leds = len(self.specs)
+
+        static = ([], [])
+        self.random_indexes = []
+        # Time gradients are indexed by the second/minute/hour, metric gradients and
+        # multi-stop gradients by the metric value, cycles and waves by their position in the loop.
+        self.time_group = LookupGroup()
+        self.metric_group = LookupGroup()
+        self.animated_group = LookupGroup()
+        self.animated_phase = []
+        for i, spec in enumerate(self.specs):
+            try:
+                self._compile_spec(i, spec, static)
+            except (ValueError, IndexError) as e:
+                print(f"Warning: invalid color '{spec}' for LED {i} ({e}), LED will stay off.")
+                static[0].append(i)
+                static[1].append((0, 0, 0))
+
+        self.static_indexes = np.array(static[0], dtype=np.intp)
+        self.static_colors = np.array(static[1], dtype=np.uint8).reshape(-1, 3)
+        self.random_indexes = np.array(self.random_indexes, dtype=np.intp)
+        self.time_group.compile()
+        self.metric_group.compile()
+        self.animated_group.compile()
+        self.animated_phase = np.array(self.animated_phase, dtype=float)
+        # What the colors depend on, to know when they can change
+        self.animated = bool(len(self.animated_group) or len(self.random_indexes))
+        self.required_metrics = {metric_names[code] for code in self.metric_group.codes.tolist()}
+        self.time_resolution = min((time_unit_seconds[code] for code in self.time_group.codes.tolist()), default=None)
+
+    def _add_static(self, static, i, color):
+        static[0].append(i)
+        static[1].append(color)
+
+    def _add_animated(self, i, colors_list, phase):
+        if colors_list[0] != colors_list[-1]:
+            colors_list.append(colors_list[0])
+        self.animated_group.add(i, cycle_lut(tuple(hex_to_rgb(c) for c in colors_list)))
+        self.animated_phase.append(phase)
+
+    def _compile_spec(self, i, spec, static):
+        if spec.lower() == "random":
+            self.random_indexes.append(i)
+        elif spec.startswith("wave_"):
+            wave_type, gradient = spec.split(";", 1)
+            colors_list = gradient.split('-')
+            if len(colors_list) < 2:
+                self._add_static(static, i, hex_to_rgb(colors_list[0]))
+            elif wave_type == "wave_ltr":
+                self._add_animated(i, colors_list, i / self.number_of_leds)
+            else: # wave_rtl
+                self._add_animated(i, colors_list, (self.number_of_leds - i) / self.number_of_leds)
+        elif ";" in spec:  # Multi-stop gradient: metric;color:value;color:value...
+            parts = spec.split(';')
+            metric = parts[0]
+            stops = []
+            for stop in parts[1:]:
+                stop_parts = stop.split(':')
+                stops.append((int(stop_parts[1]), hex_to_rgb(stop_parts[0])))
+            stops.sort(key=lambda x: x[0])
+            if metric not in metric_names:
+                print(f"Warning: {metric} not found in metrics, using first color.")
+                self._add_static(static, i, stops[0][1])
+            elif len(stops) == 1:
+                self._add_static(static, i, stops[0][1])
+            else:
+                self.metric_group.add(i, stops_lut(tuple(stops)), low=stops_domain(stops)[0], code=metric_names.index(metric))
+        elif "-" in spec:
+            split_color = spec.split("-")
+            if len(split_color) == 3:
+                start_color, end_color, metric = split_color
+                start_color, end_color = hex_to_rgb(start_color), hex_to_rgb(end_color)
+                if metric in time_units:
+                    unit = time_units.index(metric)
+                    self.time_group.add(i, linear_lut(start_color, end_color, time_lut_sizes[unit]), code=unit)
+                elif metric not in metric_names:
+                    print(f"Warning: {metric} not found in metrics, using start color.")
+                    self._add_static(static, i, start_color)
+                elif self.metrics_min_value[metric] == self.metrics_max_value[metric]:
+                    print(f"Warning: {metric} min and max values are the same, using start color.")
+                    self._add_static(static, i, start_color)
+                else:
+                    min_value, max_value = self.metrics_min_value[metric], self.metrics_max_value[metric]
+                    self.metric_group.add(i, metric_lut(start_color, end_color, min_value, max_value),
+                                          low=metric_domain(min_value, max_value)[0], code=metric_names.index(metric))
+            elif len(split_color) < 2:
+                self._add_static(static, i, hex_to_rgb(split_color[0]))
+            else:
+                self._add_animated(i, split_color, 0.0)
+        else:
+            self._add_static(static, i, hex_to_rgb(spec))
+
+    def matches(self, specs, metrics_min_value, metrics_max_value):
+        return self.specs == specs and self.metrics_min_value == metrics_min_value and self.metrics_max_value == metrics_max_value
+
+    def evaluate(self, metrics, t, cycle_duration, now=None):
+        """
+        Returns the (number_of_leds, 3) uint8 colors for the current frame.
+        t is the animation clock and cycle_duration the animation period, both in seconds.
+        """
+        colors = np.zeros((self.number_of_leds, 3), dtype=np.uint8)
+        colors[self.static_indexes] = self.static_colors
+
+        if len(self.random_indexes):
+            colors[self.random_indexes] = np.random.randint(0, 256, (len(self.random_indexes), 3), dtype=np.uint8)
+
+        if len(self.time_group):
+            if now is None:
+                now = datetime.datetime.now()
+            fields = np.array([now.second, now.minute, now.hour])
+            colors[self.time_group.indexes] = self.time_group.lookup(fields[self.time_group.codes])
+
+        if len(self.metric_group):
+            values = np.array([int(metrics.get(m, 0)) for m in metric_names])
+            colors[self.metric_group.indexes] = self.metric_group.lookup(values[self.metric_group.codes])
+
+        if len(self.animated_group):
+            position = (t / cycle_duration + self.animated_phase) % 1
+            colors[self.animated_group.indexes] = self.animated_group.lookup((position * CYCLE_LUT_SIZE).astype(np.intp))
+
+        return colors
@@ -49,8 +49,15 @@ display_modes_small = [
     "peerless_usage",
 ]
 
+# Segment mapping files (relative to the repo root) by product id, the layout_file config key overrides it
+layout_files = {
+    0x8001: "layout.json",
+}
+
 NUMBER_OF_LEDS = 84
 
+metric_names = ["cpu_temp", "gpu_temp", "cpu_usage", "gpu_usage"]
+
 default_config = {
     "display_mode": "alternate_time_with_seconds",
     "gpu_vendor": "nvidia",
@@ -232,6 +239,8 @@ default_config = {
     },
     "update_interval": 0.1,
     "metrics_update_interval": 1.0,
+    "keepalive_interval": 1.0,
+    "idle_mode": True,
     "cycle_duration": 5.0,
     "gpu_min_temp": 30.0,
     "gpu_max_temp": 90.0,
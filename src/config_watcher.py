@@ -0,0 +1,198 @@
+import ctypes
+import ctypes.util
+import json
+import os
+import shutil
+import struct
+import tempfile
+import threading
+from numbers import Number
+from devices import device_backends
+
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_event_header = struct.Struct('iIII')
+
+
+def _inotify_fd(directory):
+    """Returns a non-blocking inotify fd watching directory, or None where inotify is not available."""
+    if not hasattr(os, 'pipe2'):  # Not Linux
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        # Watch the directory: led_control.sh and the UI replace the file with mv/rename
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_MODIFY
+        if libc.inotify_add_watch(fd, os.fsencode(directory or '.'), mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+
+def validate_config(config):
+    """Returns a list of problems that make the config unusable, empty if it can be applied."""
+    if not isinstance(config, dict):
+        return ["config is not a JSON object"]
+    errors = []
+    for key in ("metrics", "time"):
+        if key in config:
+            colors = config[key].get("colors", []) if isinstance(config[key], dict) else None
+            if not isinstance(colors, list) or not all(isinstance(color, str) for color in colors):
+                errors.append(f"{key}.colors must be a list of color strings")
+    for key in ("update_interval", "cycle_duration", "metrics_update_interval"):
+        if key in config and (not isinstance(config[key], Number) or config[key] <= 0):
+            errors.append(f"{key} must be a positive number")
+    intervals = config.get("metrics_update_intervals", {})
+    if not isinstance(intervals, dict) or not all(isinstance(value, Number) and value > 0 for value in intervals.values()):
+        errors.append("metrics_update_intervals must map metrics to positive numbers")
+    # Metric ranges, a min greater than its max is drawn as a reversed gradient
+    for device in ("cpu", "gpu"):
+        for key in (f"{device}_min_temp", f"{device}_max_temp", f"{device}_min_usage", f"{device}_max_usage"):
+            if key in config and not isinstance(config[key], Number):
+                errors.append(f"{key} must be a number")
+    for key in ("display_mode", "layout_mode"):
+        if key in config and not isinstance(config[key], str):
+            errors.append(f"{key} must be a string")
+    if "keepalive_interval" in config and (not isinstance(config["keepalive_interval"], Number) or config["keepalive_interval"] < 0):
+        errors.append("keepalive_interval must be a number")
+    if config.get("device_backend", "hid") not in device_backends:
+        errors.append(f"device_backend must be one of {', '.join(device_backends)}")
+    for key in ("vendor_id", "product_id"):
+        try:
+            int(config.get(key, "0x0"), 16)
+        except (TypeError, ValueError):
+            errors.append(f"{key} must be a hexadecimal string")
+    return errors
+
+
+class ConfigWatcher:
+    """
+    Tells when the config file has changed and loads it. Uses inotify on the
+    config directory when available, and the file's mtime, size and inode otherwise
+    (inotify only wakes the stat check up). A file that does not parse or validate,
+    e.g. caught half-written, is reported as None and retried on the next change.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.inotify_fd = _inotify_fd(os.path.dirname(os.path.abspath(path)))
+        self._signature = None
+        self._pending_events = True
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size, st.st_ino)
+        except OSError:
+            return None
+
+    def _drain_inotify(self):
+        name = os.fsencode(os.path.basename(self.path))
+        try:
+            data = os.read(self.inotify_fd, 65536)
+        except BlockingIOError:
+            return False
+        changed = False
+        offset = 0
+        while offset + _event_header.size <= len(data):
+            _, _, _, length = _event_header.unpack_from(data, offset)
+            event_name = data[offset + _event_header.size:offset + _event_header.size + length].rstrip(b'\0')
+            changed = changed or event_name == name
+            offset += _event_header.size + length
+        return changed
+
+    def changed(self):
+        if self.inotify_fd is not None:
+            self._pending_events = self._drain_inotify() or self._pending_events
+            if not self._pending_events:
+                return False
+            self._pending_events = False
+        return self._stat_signature() != self._signature
+
+    def load(self):
+        """Reads and validates the config, returns None if it cannot be applied."""
+        self._signature = self._stat_signature()
+        try:
+            with open(self.path, 'r') as f:
+                config = json.load(f)
+        except Exception as e:
+            print(f"Error loading config: {e}")
+            return None
+        errors = validate_config(config)
+        if errors:
+            print(f"Error: invalid config {self.path}, keeping the previous one: {'; '.join(errors)}")
+            return None
+        return config
+
+    def close(self):
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+            self.inotify_fd = None
+
+
+def write_config_file(path, config):
+    """Writes config to path atomically: to a temporary file next to it, then renamed over it."""
+    path = os.path.realpath(path)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(config, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class ConfigWriter:
+    """
+    Saves the config changes made in memory, at most once per delay seconds: a burst of
+    changes is written once, delay seconds after the first one. pending is True until the
+    latest config saved is on disk.
+    """
+    def __init__(self, path, delay=0.5):
+        self.path = path
+        self.delay = delay
+        self.pending = False
+        self._config = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def save(self, config):
+        with self._lock:
+            self._config = config
+            self.pending = True
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Writes the pending config now."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            config = self._config
+            if config is None:
+                return
+            self._config = None
+            try:
+                write_config_file(self.path, config)
+            except OSError as e:
+                print(f"Error writing config {self.path}: {e}")
+            self.pending = False
@@ -0,0 +1,263 @@
+import argparse
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+from frame_publisher import get_runtime_dir, is_listening
+
+# Requests are one JSON object per connection, on one line, answered with one JSON line
+# ({"ok": true, ...} or {"ok": false, "error": ...}):
+#   {"op": "get"}                                      the config, as "config"
+#   {"op": "set", "values": {...}}                     replaces top-level keys, e.g. display_mode, update_interval
+#   {"op": "set_colors", "key": "metrics", "start": 0, "end": 41, "color": "ff0000"}
+#                                                      sets the colors of LEDs start to end (included) of
+#                                                      metrics or time, or of a "leds" list of indexes instead
+# A request with a "config_path" is refused with "other_config" if the controller uses another config file.
+_max_request_size = 1 << 20
+
+
+def get_control_socket_path():
+    """The Unix socket the controller takes config changes on."""
+    default = os.path.join(get_runtime_dir(), 'digital_lcd_control.sock')
+    return os.environ.get('DIGITAL_LCD_CONTROL_SOCKET', default)
+
+
+def apply_request(config, request):
+    """The config with the changes of a set or set_colors request. config itself is not modified."""
+    config = dict(config)
+    op = request.get("op")
+    if not isinstance(op, str):
+        raise ValueError("op must be a string")
+    if op == "set":
+        values = request.get("values")
+        if not isinstance(values, dict):
+            raise ValueError("set needs a values object")
+        config.update(values)
+    elif op == "set_colors":
+        key = request.get("key", "metrics")
+        if not isinstance(key, str) or key not in ("metrics", "time"):
+            raise ValueError("key must be metrics or time")
+        section = config.get(key, {})
+        if not isinstance(section, dict) or not isinstance(section.get("colors", []), list):
+            raise ValueError(f"{key}.colors is not a list")
+        colors = list(section.get("colors", []))
+        if "leds" in request:
+            leds = request["leds"]
+            if not isinstance(leds, list):
+                raise ValueError("leds must be a list of LED indexes")
+        elif isinstance(request.get("start"), int) and isinstance(request.get("end", request.get("start")), int):
+            leds = range(request["start"], request.get("end", request["start"]) + 1)
+        else:
+            raise ValueError("set_colors needs leds or start and end")
+        color = request.get("color")
+        if not isinstance(color, str):
+            raise ValueError("color must be a string")
+        for led in leds:
+            if not isinstance(led, int) or not 0 <= led < len(colors):
+                raise ValueError(f"LED {led} is not in {key}.colors")
+            colors[led] = color
+        config[key] = dict(section, colors=colors)
+    else:
+        raise ValueError(f"unknown op {op}")
+    return config
+
+
+class ControlServer:
+    """
+    Takes config change requests on a Unix socket. Connections are read by a background
+    thread, but the requests are handled by the render loop in process(), so that the config
+    state is only touched from one thread; wakeup (an Event) is set on each request so that
+    an idle render loop handles it at once. A client waits up to timeout seconds for its answer.
+    """
+    def __init__(self, path, wakeup=None, timeout=10.0):
+        self.path = path
+        self.wakeup = wakeup
+        self.timeout = timeout
+        self.pending = queue.Queue()  # (request, done Event, response dict)
+        self.server = None
+        self._thread = None
+        if not hasattr(socket, "AF_UNIX"):
+            print("Warning: Unix sockets are not available, config changes are only read from the config file.")
+            return
+        if os.path.exists(path):
+            if is_listening(path):
+                print(f"Warning: {path} is used by another process, config changes are only read from the config file.")
+                return
+            os.unlink(path)
+        try:
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            server.bind(path)
+            server.listen(4)
+        except OSError as e:
+            print(f"Warning: could not take config changes on {path}: {e}")
+            return
+        self.server = server
+        self._thread = threading.Thread(target=self._run, name="control-server", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        server = self.server
+        while True:
+            try:
+                client, _ = server.accept()
+            except OSError:
+                # Closed
+                return
+            try:
+                client.settimeout(self.timeout)
+                response = self._handle(client)
+                client.sendall(json.dumps(response).encode() + b"\n")
+            except OSError:
+                pass
+            finally:
+                client.close()
+
+    def _handle(self, client):
+        data = b""
+        while b"\n" not in data and len(data) < _max_request_size:
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+        try:
+            request = json.loads(data.split(b"\n", 1)[0])
+        except ValueError as e:
+            return {"ok": False, "error": f"invalid request: {e}"}
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "invalid request: not a JSON object"}
+        done = threading.Event()
+        response = {}
+        self.pending.put((request, done, response))
+        if self.wakeup is not None:
+            self.wakeup.set()
+        if not done.wait(self.timeout):
+            return {"ok": False, "error": "the controller did not answer in time, the change may still be applied"}
+        return response
+
+    def process(self, handler):
+        """
+        Answers the pending requests with handler(request), which returns the response or raises
+        ValueError for a request it refuses. Any other error is reported to the client as well,
+        it never reaches the render loop.
+        """
+        while True:
+            try:
+                request, done, response = self.pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                response.update(handler(request))
+            except ValueError as e:
+                response.update(ok=False, error=str(e))
+            except Exception as e:
+                print(f"Error handling control request {request}: {e!r}")
+                response.update(ok=False, error=f"internal error: {e!r}")
+            finally:
+                done.set()
+
+    def close(self):
+        if self.server is not None:
+            # shutdown() wakes the thread up from accept()
+            try:
+                self.server.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.server.close()
+            self.server = None
+            self._thread.join(timeout=2)
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+def send_request(request, config_path=None, path=None, timeout=15.0):
+    """
+    Sends a request to the controller and returns its response. Returns None when no controller
+    is listening, or when config_path is given and the controller uses another config file.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    if config_path is not None:
+        request = dict(request, config_path=os.path.abspath(config_path))
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        try:
+            sock.connect(path or get_control_socket_path())
+        except OSError:
+            return None
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        data = b""
+        while b"\n" not in data:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    finally:
+        sock.close()
+    response = json.loads(data)
+    if response.get("other_config"):
+        return None
+    return response
+
+
+def _parse_value(value):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Changes the config of the running controller, which applies and saves it at once. "
+                                                 "Exits with status 3 if the controller is not running.")
+    parser.add_argument("--config", metavar="PATH", help="Only talk to a controller that uses this config file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("get", help="Print the config")
+    set_parser = commands.add_parser("set", help="Set top-level keys, values are parsed as JSON when they can be")
+    set_parser.add_argument("values", nargs="+", metavar="KEY=VALUE")
+    patch_parser = commands.add_parser("patch", help="Set the top-level keys of a JSON object")
+    patch_parser.add_argument("values", metavar="JSON")
+    colors_parser = commands.add_parser("set-colors", help="Set the color of a range of LEDs")
+    colors_parser.add_argument("key", choices=["metrics", "time"])
+    colors_parser.add_argument("start", type=int)
+    colors_parser.add_argument("end", type=int, help="Last LED, included")
+    colors_parser.add_argument("color", help="Color or color spec, e.g. ff0000")
+    args = parser.parse_args()
+
+    if args.command == "get":
+        request = {"op": "get"}
+    elif args.command == "set":
+        values = {}
+        for value in args.values:
+            key, separator, value = value.partition("=")
+            if not separator:
+                parser.error(f"{key} is not KEY=VALUE")
+            values[key] = _parse_value(value)
+        request = {"op": "set", "values": values}
+    elif args.command == "patch":
+        request = {"op": "set", "values": _parse_value(args.values)}
+    else:
+        request = {"op": "set_colors", "key": args.key, "start": args.start, "end": args.end, "color": args.color}
+
+    try:
+        response = send_request(request, config_path=args.config)
+    except (OSError, ValueError) as e:
+        print(f"Error talking to the controller: {e}", file=sys.stderr)
+        return 1
+    if response is None:
+        print("The controller is not running.", file=sys.stderr)
+        return 3
+    if not response.get("ok"):
+        print(f"Error: {response.get('error')}", file=sys.stderr)
+        return 1
+    if args.command == "get":
+        print(json.dumps(response["config"], indent=4))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,605 +1,314 @@
 import numpy as np
 from metrics import Metrics
-from config import leds_indexes, NUMBER_OF_LEDS, leds_indexes_small, display_modes, display_modes_small
-from utils import interpolate_color, get_random_color
-import hid
+from config import NUMBER_OF_LEDS
+from packet_encoder import PacketEncoder
+from hid_writer import HidWriter
+from config_watcher import ConfigWatcher, ConfigWriter, validate_config
+from frame_scheduler import FrameScheduler
+from renderer import Renderer
+from stats import stage_stats
+from devices import open_device
+from frame_publisher import FramePublisher, get_runtime_dir, get_socket_path
+from control_socket import ControlServer, apply_request, get_control_socket_path
 import time
 import datetime 
-import json
 import os
 import sys
+import argparse
+import signal
 
 
-digit_to_segments = {
-    0: ['a', 'b', 'c', 'd', 'e', 'f'],
-    1: ['b', 'c'],
-    2: ['a', 'b', 'g', 'e', 'd'],
-    3: ['a', 'b', 'g', 'c', 'd'],
-    4: ['f', 'g', 'b', 'c'],
-    5: ['a', 'f', 'g', 'c', 'd'],
-    6: ['a', 'f', 'g', 'e', 'c', 'd'],
-    7: ['a', 'b', 'c'],
-    8: ['a', 'b', 'c', 'd', 'e', 'f', 'g'],
-    9: ['a', 'b', 'g', 'f', 'c', 'd'],
-}
-
-digit_mask = np.array(
-    [
-        [1, 1, 1, 1, 1, 1, 1],  # 0
-        [1, 1, 1, 1, 1, 1, 1],  # 1
-        [1, 1, 1, 1, 1, 1, 1],  # 2
-        [1, 1, 1, 1, 1, 1, 1],  # 3
-        [1, 1, 1, 1, 1, 1, 1],  # 4
-        [1, 1, 1, 1, 1, 1, 1],  # 5
-        [1, 1, 1, 1, 1, 1, 1],  # 6
-        [1, 1, 1, 1, 1, 1, 1],  # 7
-        [1, 1, 1, 1, 1, 1, 1],  # 8
-        [1, 1, 1, 1, 1, 1, 1],  # 9
-        [1, 1, 1, 1, 1, 1, 1],  # nothing
-    ]
-)
-
-letter_mask = {
-    'H': [1, 0, 1, 1, 1, 0, 1],
-}
-
-
-
-def _number_to_array(number):
-    if number>=10:
-        return _number_to_array(int(number/10))+[number%10]
-    else:
-        return [number]
-
-def get_number_array(temp, array_length=3, fill_value=-1):
-    if temp<0:
-        return [fill_value]*array_length
-    else:
-        narray = _number_to_array(temp)
-        if (len(narray)!=array_length):
-            if(len(narray)<array_length):
-                narray = np.concatenate([[fill_value]*(array_length-len(narray)),narray])
-            else:
-                narray = narray[1:]
-        return narray
+# Idle mode: longest sleep between frames so config file changes are still picked up quickly,
+# and how long to wake up after a clock or phase boundary to be sure to be past it.
+max_idle_sleep = 1.0
+idle_wake_margin = 0.005
 
 class Controller:
-    def __init__(self, config_path=None):
-        self.temp_unit = {"cpu": "celsius", "gpu": "celsius"}
-        self.metrics = Metrics()
+    def __init__(self, config_path=None, metrics=None):
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.metrics.start()
         self.VENDOR_ID = 0x0416   
         self.PRODUCT_ID = 0x8001 
-        self.dev = self.get_device()
+        self.device_backend = "hid"
+        self.capture_path = None
+        self.device_settings = None  # Opened by apply_config()
+        self.recorded_capture = None  # Capture file already written by this run, appended to when the device is reopened
+        self.writer = None
+        self.dev = None
         self.HEADER = 'dadbdcdd000000000000000000000000fc0000ff'
-        self.leds = np.array([0] * NUMBER_OF_LEDS)
-        self.leds_indexes = leds_indexes
+        self.encoder = PacketEncoder(NUMBER_OF_LEDS, bytes.fromhex(self.HEADER))
+        self.frame = np.zeros((NUMBER_OF_LEDS, 3), dtype=np.uint8)  # Last rendered frame, set in update()
+        self.snapshot = {}  # Metrics of the last rendered frame
+        self.last_frame = None  # Encoded reports last sent to the writer
+        self.last_send_time = 0
+        self.keepalive_interval = 1.0
         # Configurable config path
         if config_path is None:
             self.config_path = os.environ.get('DIGITAL_LCD_CONFIG', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config.json'))
         else:
             self.config_path = config_path
-        self.cpt = 0  # For alternate_time cycling
-        self.cycle_duration = 50
-        self.display_mode = None
-        self.colors = np.array(["ffe000"] * NUMBER_OF_LEDS)  # Will be set in update()
-        self.layout = self.load_layout()
+        # Where SIGUSR1 dumps the stats, and the record device backend writes its frames by default
+        runtime_dir = get_runtime_dir()
+        self.stats_path = os.environ.get('DIGITAL_LCD_STATS', os.path.join(runtime_dir, 'digital_lcd_stats.json'))
+        self.default_capture_path = os.path.join(runtime_dir, 'digital_lcd_capture.bin')
+        self.scheduler = FrameScheduler(0.1)
+        self.clock = 0.0  # Animation time in seconds, drives the color animations and the alternate modes
+        self.renderer = None  # Color plans, layout and display mode of the config, set in apply_config()
+        self.config_watcher = ConfigWatcher(self.config_path)
+        # Changes made through the control socket are applied at once and saved shortly after
+        self.config_writer = ConfigWriter(self.config_path)
+        # The frames sent to the device, for the UI mirror
+        self.publisher = FramePublisher(get_socket_path())
+        self.apply_config(self.load_config())
+        # Control requests wake an idle display loop up like a new metrics snapshot
+        self.control = ControlServer(get_control_socket_path(), wakeup=self.metrics.published)
         self.update()
 
     def load_config(self):
-        try:
-            with open(self.config_path, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Error loading config: {e}")
-            return None
-
-    def load_layout(self):
-        try:
-            layout_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'layout.json')
-            with open(layout_path, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Error loading layout: {e}")
-            return None
+        return self.config_watcher.load()
 
     def get_device(self):
-        try:
-            return hid.Device(self.VENDOR_ID, self.PRODUCT_ID)
-        except Exception as e:
-            print(f"Error initializing HID device: {e}")
-            return None
-
-    def set_leds(self, key, value):
-        try:
-            self.leds[self.leds_indexes[key]] = value
-        except KeyError:
-            print(f"Warning: Key {key} not found in leds_indexes.")
+        append = self.device_backend == "record" and self.capture_path == self.recorded_capture
+        dev = open_device(self.device_backend, self.VENDOR_ID, self.PRODUCT_ID, self.capture_path, append=append)
+        if dev is not None and self.device_backend == "record":
+            self.recorded_capture = self.capture_path
+        return dev
+
+    def open_device(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.dev = self.get_device()
+        # The writer thread owns the device from now on, nothing else writes to it
+        self.writer = HidWriter(self.dev) if self.dev is not None else None
+        self.last_frame = None
+
+    def close(self):
+        self.metrics.close()
+        self.control.close()
+        self.config_writer.flush()
+        self.config_watcher.close()
+        self.publisher.close()
+        if self.writer is not None:
+            print(f"HID writer stats: {self.writer.stats()}")
+            self.writer.close()
+            self.writer = None
+        print(f"Frame scheduler stats: {self.scheduler.stats()}")
 
     def send_packets(self):
-        message = "".join([self.colors[i] if self.leds[i] != 0 else "000000" for i in range(NUMBER_OF_LEDS)])
-        packet0 = bytes.fromhex(self.HEADER+message[:128-len(self.HEADER)])
-        self.dev.write(packet0)
-        packets = message[88:]
-        for i in range(0,4):
-            packet = bytes.fromhex('00'+packets[i*128:(i+1)*128])
-            self.dev.write(packet)
-
-    def set_temp(self, temperature: int, device='cpu', unit="celsius"):        
-        if temperature < 1000:
-            self.set_leds(device + '_temp', digit_mask[get_number_array(temperature)].flatten())
-            if unit == "celsius":
-                self.set_leds(device + '_celsius', 1)
-            elif unit == "fahrenheit":
-                self.set_leds(device + '_fahrenheit', 1)
-        else:
-            raise Exception("The numbers displayed on the temperature LCD must be less than 1000")
-
-    def set_usage(self, usage : int, device='cpu'):
-        if usage<200:
-            self.set_leds(device+'_usage', np.concatenate(([int(usage>=100)]*2,digit_mask[get_number_array(usage, array_length=2)].flatten())))
-            self.set_leds(device+'_percent_led', 1)
-        else:
-            raise Exception("The numbers displayed on the usage LCD must be less than 200")
-
-    def draw_number(self, number, num_digits, digits_mapping):
-        number_str = f"{number:0{num_digits}d}"
-        for i, digit_char in enumerate(number_str):
-            digit = int(digit_char)
-            segments_to_light = digit_to_segments[digit]
-            digit_map = digits_mapping[i]['map']
-            for segment_name in segments_to_light:
-                segment_index = digit_map[segment_name]
-                self.leds[segment_index] = 1
-
-    def display_peerless_standard(self):
-        """Merged display mode: dual_metrics + peerless_standard with color support"""
-        if not self.layout:
-            print("Warning: layout.json not loaded. Cannot display peerless standard.")
-            return
-
-        cpu_unit = self.config.get('cpu_temperature_unit', 'celsius')
-        gpu_unit = self.config.get('gpu_temperature_unit', 'celsius')
-        temp_unit = {'cpu': cpu_unit, 'gpu': gpu_unit}
-
-        metrics = self.metrics.get_metrics(temp_unit=temp_unit)
-        
-        # Get colors based on current metrics
-        self.colors = self.get_config_colors(self.config, key="metrics", metrics=metrics)
-
-        cpu_temp = metrics.get("cpu_temp", 0)
-        cpu_usage = metrics.get("cpu_usage", 0)
-        gpu_temp = metrics.get("gpu_temp", 0)
-        gpu_usage = metrics.get("gpu_usage", 0)
-
-        # Draw CPU Temp
-        self.draw_number(cpu_temp, 3, self.layout['cpu_temp_digits'])
-        if cpu_unit == 'celsius':
-            self.leds[self.layout['cpu_celsius']] = 1
-        else:
-            self.leds[self.layout['cpu_fahrenheit']] = 1
-
-        # Draw CPU Usage
-        self.draw_number(cpu_usage % 100, 2, self.layout['cpu_usage_digits'])
-        if cpu_usage >= 100:
-            self.leds[self.layout['cpu_usage_1']['top']] = 1
-            self.leds[self.layout['cpu_usage_1']['bottom']] = 1
-        self.leds[self.layout['cpu_percent']] = 1
-
-        # Draw GPU Temp
-        self.draw_number(gpu_temp, 3, self.layout['gpu_temp_digits'])
-        if gpu_unit == 'celsius':
-            self.leds[self.layout['gpu_celsius']] = 1
-        else:
-            self.leds[self.layout['gpu_fahrenheit']] = 1
-
-        # Draw GPU Usage
-        self.draw_number(gpu_usage % 100, 2, self.layout['gpu_usage_digits'][::-1])
-        if gpu_usage >= 100:
-            self.leds[self.layout['gpu_usage_1']['top']] = 1
-            self.leds[self.layout['gpu_usage_1']['bottom']] = 1
-        self.leds[self.layout['gpu_percent']] = 1
-        
-        # Set CPU and GPU LEDs
-        for led in self.layout['cpu_led']:
-            self.leds[led] = 1
-        for led in self.layout['gpu_led']:
-            self.leds[led] = 1
-
-    def display_peerless_temp(self):
-        if not self.layout:
-            print("Warning: layout.json not loaded. Cannot display peerless temp.")
-            return
-
-        cpu_unit = self.config.get('cpu_temperature_unit', 'celsius')
-        gpu_unit = self.config.get('gpu_temperature_unit', 'celsius')
-        temp_unit = {'cpu': cpu_unit, 'gpu': gpu_unit}
-
-        metrics = self.metrics.get_metrics(temp_unit=temp_unit)
-        self.colors = self.get_config_colors(self.config, key="metrics", metrics=metrics)
-        
-        cpu_temp = metrics.get("cpu_temp", 0)
-        gpu_temp = metrics.get("gpu_temp", 0)
-
-        # Draw CPU Temp
-        self.draw_number(cpu_temp, 3, self.layout['cpu_temp_digits'])
-        if cpu_unit == 'celsius':
-            self.leds[self.layout['cpu_celsius']] = 1
-        else:
-            self.leds[self.layout['cpu_fahrenheit']] = 1
-
-        # Draw GPU Temp
-        self.draw_number(gpu_temp, 3, self.layout['gpu_temp_digits'])
-        if gpu_unit == 'celsius':
-            self.leds[self.layout['gpu_celsius']] = 1
-        else:
-            self.leds[self.layout['gpu_fahrenheit']] = 1
-        
-        # Set CPU and GPU LEDs
-        for led in self.layout['cpu_led']:
-            self.leds[led] = 1
-        for led in self.layout['gpu_led']:
-            self.leds[led] = 1
-
-    def display_peerless_usage(self):
-        if not self.layout:
-            print("Warning: layout.json not loaded. Cannot display peerless usage.")
-            return
-
-        cpu_unit = self.config.get('cpu_temperature_unit', 'celsius')
-        gpu_unit = self.config.get('gpu_temperature_unit', 'celsius')
-        temp_unit = {'cpu': cpu_unit, 'gpu': gpu_unit}
-
-        metrics = self.metrics.get_metrics(temp_unit=temp_unit)
-        self.colors = self.get_config_colors(self.config, key="metrics", metrics=metrics)
-        
-        cpu_usage = metrics.get("cpu_usage", 0)
-        gpu_usage = metrics.get("gpu_usage", 0)
-
-        # Draw CPU Usage
-        self.draw_number(cpu_usage % 100, 2, self.layout['cpu_usage_digits'])
-        if cpu_usage >= 100:
-            self.leds[self.layout['cpu_usage_1']['top']] = 1
-            self.leds[self.layout['cpu_usage_1']['bottom']] = 1
-        self.leds[self.layout['cpu_percent']] = 1
-
-        # Draw GPU Usage
-        self.draw_number(gpu_usage % 100, 2, self.layout['gpu_usage_digits'])
-        if gpu_usage >= 100:
-            self.leds[self.layout['gpu_usage_1']['top']] = 1
-            self.leds[self.layout['gpu_usage_1']['bottom']] = 1
-        self.leds[self.layout['gpu_percent']] = 1
-        
-        # Set CPU and GPU LEDs
-        for led in self.layout['cpu_led']:
-            self.leds[led] = 1
-        for led in self.layout['gpu_led']:
-            self.leds[led] = 1
-
-    def display_metrics(self, devices=["cpu","gpu"]):
-        self.temp_unit = {device: self.config.get(f"{device}_temperature_unit", "celsius")for device in ["cpu","gpu"]}
-        metrics = self.metrics.get_metrics(temp_unit=self.temp_unit)
-        for device in devices:
-            self.set_leds(device+"_led", 1)
-            self.set_temp(metrics[device+"_temp"], device=device, unit=self.temp_unit[device])
-            self.set_usage(metrics[device+"_usage"], device=device)
-            self.colors[self.leds_indexes[device]] = self.metrics_colors[self.leds_indexes[device]]
-
-    def display_time(self, device="cpu"):
-        current_time = datetime.datetime.now()
-        self.set_leds(device+'_temp', np.concatenate((digit_mask[get_number_array(current_time.hour, array_length=2, fill_value=0)].flatten(),letter_mask["H"])))
-        self.set_leds(device+'_usage', np.concatenate(([0,0],digit_mask[get_number_array(current_time.minute, array_length=2, fill_value=0)].flatten())))
-        self.colors[self.leds_indexes[device]] = self.time_colors[self.leds_indexes[device]]
-    
-    def display_time_with_seconds(self):
-        current_time = datetime.datetime.now()
-        self.set_leds('cpu_temp', np.concatenate((digit_mask[get_number_array(current_time.hour, array_length=2, fill_value=0)].flatten(),letter_mask["H"])))
-        self.set_leds('gpu_usage', np.concatenate(([0,0],digit_mask[get_number_array(current_time.second, array_length=2, fill_value=0)].flatten())))
-        self.set_leds('cpu_usage', np.concatenate(([0,0],digit_mask[get_number_array(current_time.minute, array_length=2, fill_value=0)].flatten())))
-        self.colors = self.time_colors
-
-    def display_temp_small(self, device='cpu'):
-        unit = {device: self.config.get(f"{device}_temperature_unit", "celsius")for device in ["cpu","gpu"]}
-        self.set_leds(unit[device], 1)
-        self.set_leds(device+'_led', 1)
-        current_temp = self.metrics.get_metrics(self.temp_unit)[f"{device}_temp"]
-        self.colors = self.metrics_colors
-        if current_temp is not None:
-            self.set_leds('digit_frame', digit_mask[get_number_array(current_temp, array_length=3, fill_value=0)].flatten())
-        else:
-            print(f"Warning: {device} temperature not available.")
-    
-    def display_usage_small(self, device='cpu'):   
-        current_usage = self.metrics.get_metrics(self.temp_unit)[f"{device}_usage"]
-        self.set_leds('percent_led', 1)
-        self.set_leds(device+'_led', 1)
-        self.colors = self.metrics_colors
-        if current_usage is not None:
-            self.set_leds('digit_frame', digit_mask[get_number_array(current_usage, array_length=3, fill_value=0)].flatten())
-        else:
-            print(f"Warning: {device} usage not available.")
+        with stage_stats.timer("encode"):
+            reports = self.encoder.encode(self.frame)
+        now = time.monotonic()
+        # Skip the USB writes when the device already shows this frame, but resend it
+        # every keepalive_interval in case the device expects regular reports.
+        if self.encoder.buffer == self.last_frame and now - self.last_send_time < self.keepalive_interval:
+            return False
+        # Copies of the reports, the encoder buffer is reused for the next frame
+        self.writer.submit([bytes(report) for report in reports])
+        self.last_frame = bytes(self.encoder.buffer)
+        self.last_send_time = now
+        with stage_stats.timer("publish"):
+            self.publisher.publish(self.encoder.buffer, self.snapshot, NUMBER_OF_LEDS, self.encoder.header)
+        return True
 
     def get_config_colors(self, config, key="metrics", metrics=None):
-        conf_colors = config.get(key, {}).get('colors', ["ffe000"] * NUMBER_OF_LEDS)
-        if len(conf_colors) != NUMBER_OF_LEDS:
-            print(f"Warning: config {key} colors length mismatch, using default colors.")
-            colors = ["ff0000"] * NUMBER_OF_LEDS
+        if metrics is None:
+            metrics = self.metrics.get_metrics(self.renderer.temp_unit)
+        plan = self.renderer.compile_color_plan(config, key)
+        return plan.evaluate(metrics, self.clock, self.renderer.cycle_duration)
+
+    def apply_config(self, config):
+        """
+        Derives everything that only depends on the config. All the new state is computed
+        first and swapped in at the end, so a config that fails halfway is never partially applied.
+        """
+        if self.renderer is not None and self.renderer.matches(config):
+            renderer = self.renderer
         else:
-            if metrics is None:
-                metrics = self.metrics.get_metrics(self.temp_unit)
-            colors = []
-            for i, color in enumerate(conf_colors):
-                if color.lower() == "random":
-                    colors.append(get_random_color())
-                elif color.startswith("wave_"):
-                    wave_type, gradient = color.split(";", 1)
-                    colors_list = gradient.split('-')
-                    num_colors = len(colors_list)
-                    
-                    if num_colors >= 2:
-                        if colors_list[0] != colors_list[-1]:
-                            colors_list.append(colors_list[0])
-                        
-                        num_segments = len(colors_list) - 1
-                        total_duration = self.cycle_duration
-                        
-                        if wave_type == "wave_ltr":
-                            phase_shift = (i / NUMBER_OF_LEDS) * total_duration
-                        else: # wave_rtl
-                            phase_shift = ((NUMBER_OF_LEDS - i) / NUMBER_OF_LEDS) * total_duration
-                        
-                        time_in_cycle = (self.cpt + phase_shift) % total_duration
-                        
-                        if num_segments > 0:
-                            segment_duration = total_duration / num_segments
-                            segment_index = min(int(time_in_cycle / segment_duration), num_segments - 1)
-                            
-                            start_color = colors_list[segment_index]
-                            end_color = colors_list[segment_index + 1]
-                            
-                            time_in_segment = time_in_cycle - (segment_index * segment_duration)
-                            if segment_duration > 0:
-                                factor = time_in_segment / segment_duration
-                            else:
-                                factor = 0
-                            colors.append(interpolate_color(start_color, end_color, factor))
-                        else:
-                            colors.append(colors_list[0])
-                    else:
-                        colors.append(colors_list[0])
-                elif ";" in color:  # New multi-stop gradient format
-                    parts = color.split(';')
-                    metric = parts[0]
-                    stops = []
-                    for stop in parts[1:]:
-                        stop_parts = stop.split(':')
-                        stops.append({'color': stop_parts[0], 'value': int(stop_parts[1])})
-                    
-                    stops.sort(key=lambda x: x['value'])
-                    
-                    if metric not in metrics:
-                        print(f"Warning: {metric} not found in metrics, using first color.")
-                        colors.append(stops[0]['color'])
-                        continue
-
-                    metric_value = metrics[metric]
-
-                    if metric_value <= stops[0]['value']:
-                        colors.append(stops[0]['color'])
-                        continue
-                    
-                    if metric_value >= stops[-1]['value']:
-                        colors.append(stops[-1]['color'])
-                        continue
-
-                    for j in range(len(stops) - 1):
-                        if stops[j]['value'] <= metric_value < stops[j+1]['value']:
-                            start_stop = stops[j]
-                            end_stop = stops[j+1]
-                            factor = (metric_value - start_stop['value']) / (end_stop['value'] - start_stop['value'])
-                            colors.append(interpolate_color(start_stop['color'], end_stop['color'], factor))
-                            break
-                elif "-" in color:
-                    split_color = color.split("-")
-                    if len(split_color) == 3:
-                        start_color, end_color, metric = split_color
-                        current_time = datetime.datetime.now()
-                        if metric == "seconds":
-                            factor = current_time.second / 59
-                        elif metric == "minutes":
-                            factor = current_time.minute / 59
-                        elif metric == "hours":
-                            factor = current_time.hour / 23
-                        else:
-                            if metric not in metrics:
-                                print(f"Warning: {metric} not found in metrics, using start color.")
-                                factor = 0
-                            elif self.metrics_min_value[metric] == self.metrics_max_value[metric]:
-                                print(f"Warning: {metric} min and max values are the same, using start color.")
-                                factor = 0
-                            else:
-                                metric_value = metrics[metric]
-                                min_val = self.metrics_min_value[metric]
-                                max_val = self.metrics_max_value[metric]
-                                factor = (metric_value - min_val) / (max_val - min_val)
-                                factor = max(0, min(1, factor)) # Clamp factor between 0 and 1
-                        colors.append(interpolate_color(start_color, end_color, factor))
-                    else:
-                        colors_list = split_color
-                        num_colors = len(colors_list)
-                        
-                        if num_colors >= 2:
-                            # Add first color to the end to make a loop
-                            if colors_list[0] != colors_list[-1]:
-                                colors_list.append(colors_list[0])
-                            
-                            num_segments = len(colors_list) - 1
-                            total_duration = self.cycle_duration # number of steps
-                            time_in_cycle = self.cpt % total_duration
-                            
-                            if num_segments > 0:
-                                segment_duration = total_duration / num_segments
-                                segment_index = min(int(time_in_cycle / segment_duration), num_segments - 1)
-                                
-                                start_color = colors_list[segment_index]
-                                end_color = colors_list[segment_index + 1]
-                                
-                                time_in_segment = time_in_cycle - (segment_index * segment_duration)
-                                if segment_duration > 0:
-                                    factor = time_in_segment / segment_duration
-                                else:
-                                    factor = 0
-                                colors.append(interpolate_color(start_color, end_color, factor))
-                            else:
-                                colors.append(colors_list[0])
-                        else:
-                            colors.append(colors_list[0])
-                else:
-                    colors.append(color)
-        return np.array(colors)
-    
-    def update(self):
-        self.leds = np.array([0] * NUMBER_OF_LEDS)
-        self.config = self.load_config()
-        if self.config:
-            VENDOR_ID = int(self.config.get('vendor_id', "0x0416"),16)
-            PRODUCT_ID = int(self.config.get('product_id', "0x8001"),16)
-            self.metrics_max_value = {
-                "cpu_temp": self.config.get('cpu_max_temp', 90),
-                "gpu_temp": self.config.get('gpu_max_temp', 90),
-                "cpu_usage": self.config.get('cpu_max_usage', 100),
-                "gpu_usage": self.config.get('gpu_max_usage', 100),
-            }
-            self.metrics_min_value = {
-                "cpu_temp": self.config.get('cpu_min_temp', 30),
-                "gpu_temp": self.config.get('gpu_min_temp', 30),
-                "cpu_usage": self.config.get('cpu_min_usage', 0),
-                "gpu_usage": self.config.get('gpu_min_usage', 0),
-            }
-            self.display_mode = self.config.get('display_mode', 'metrics')
-            
-            # Handle legacy dual_metrics mode
-            if self.display_mode == 'dual_metrics':
-                self.display_mode = 'peerless_standard'
-                
-            self.temp_unit = {device: self.config.get(f"{device}_temperature_unit", "celsius") for device in ["cpu", "gpu"]}
-            self.metrics_colors = self.get_config_colors(self.config, key="metrics")
-            self.time_colors = self.get_config_colors(self.config, key="time")
-            self.update_interval = self.config.get('update_interval', 0.1)
-            self.cycle_duration = int(self.config.get('cycle_duration', 5)/self.update_interval)
-            self.metrics.update_interval = self.config.get('metrics_update_interval', 0.5)
-            if self.config.get('layout_mode', 'big')== 'small':
-                self.leds_indexes = leds_indexes_small
-                if self.display_mode not in display_modes_small:
-                    print(f"Warning: Display mode {self.display_mode} not compatible with small layout, switching to alternate metrics.")
-                    self.display_mode = "alternate_metrics"
-            else:
-                self.leds_indexes = leds_indexes
-                if self.display_mode not in display_modes:
-                    print(f"Warning: Display mode {self.display_mode} not compatible with big layout, switching to metrics.")
-                    self.display_mode = "metrics"
+            renderer = Renderer(config, previous=self.renderer)
+            # A config that passes validate_config() can still fail to render, find out before it is applied
+            renderer.frame(self.metrics.get_metrics(renderer.temp_unit), self.clock)
+        if config:
+            VENDOR_ID = int(config.get('vendor_id', "0x0416"),16)
+            PRODUCT_ID = int(config.get('product_id', "0x8001"),16)
+            update_interval = config.get('update_interval', 0.1)
+            metrics_update_interval = config.get('metrics_update_interval', 0.5)
+            metric_intervals = config.get('metrics_update_intervals', {})
+            keepalive_interval = config.get('keepalive_interval', 1.0)
+            idle_mode = config.get('idle_mode', True)
+            device_backend = config.get('device_backend', 'hid')
+            capture_path = config.get('capture_file') or self.default_capture_path
         else:
             VENDOR_ID = 0x0416
             PRODUCT_ID = 0x8001
-            self.metrics_max_value = {
-                "cpu_temp": 90,
-                "gpu_temp": 90,
-                "cpu_usage": 100,
-                "gpu_usage": 100,
-            }
-            self.metrics_min_value = {
-                "cpu_temp": 30,
-                "gpu_temp": 30,
-                "cpu_usage": 0,
-                "gpu_usage": 0,
-            }
-            self.display_mode = 'metrics'
-            self.time_colors = np.array(["ffe000"] * NUMBER_OF_LEDS)
-            self.metrics_colors = np.array(["ff0000"] * NUMBER_OF_LEDS)
-            self.update_interval = 0.1
-            self.cycle_duration = int(5/self.update_interval)
-            self.metrics.update_interval = 0.5
-            self.leds_indexes = leds_indexes
-        
-
-        if VENDOR_ID != self.VENDOR_ID or PRODUCT_ID != self.PRODUCT_ID:
-            print(f"Warning: Config VENDOR_ID or PRODUCT_ID changed, reinitializing device.")
+            update_interval = 0.1
+            metrics_update_interval = 0.5
+            metric_intervals = {}
+            keepalive_interval = 1.0
+            idle_mode = True
+            device_backend = "hid"
+            capture_path = self.default_capture_path
+
+        self.config = config or {}
+        self.renderer = renderer
+        self.mode = renderer.mode
+        self.update_interval = update_interval
+        self.scheduler.set_interval(update_interval)
+        self.metrics.update_interval = metrics_update_interval
+        self.metrics.metric_intervals = metric_intervals
+        self.keepalive_interval = keepalive_interval
+        self.idle_mode = idle_mode
+        # Only sample what the mode shows or colors depend on
+        self.required_metrics = renderer.required_metrics()
+        self.metrics.set_required(self.required_metrics)
+
+        device_settings = (VENDOR_ID, PRODUCT_ID, device_backend, capture_path)
+        if device_settings != self.device_settings:
+            if self.device_settings is not None:
+                print(f"Warning: Config VENDOR_ID, PRODUCT_ID or device backend changed, reinitializing device.")
             self.VENDOR_ID = VENDOR_ID
             self.PRODUCT_ID = PRODUCT_ID
-            self.dev = self.get_device()
+            self.device_backend = device_backend
+            self.capture_path = capture_path
+            self.device_settings = device_settings
+            self.open_device()
+
+    def reload_config(self):
+        """Applies the config file if it changed since the last check, keeps the current config if it is invalid."""
+        if self.config_writer.pending:
+            # The config in memory is newer than the file until the control changes are saved
+            return
+        if self.config_watcher.changed():
+            config = self.config_watcher.load()
+            if config is not None and config != self.config:
+                try:
+                    self.apply_config(config)
+                except Exception as e:
+                    # apply_config() swaps the new state in last, the previous config is still whole
+                    print(f"Error: could not apply config {self.config_path}, keeping the previous one: {e}")
+
+    def handle_control_request(self, request):
+        """Applies a control socket request (see control_socket.py) to the config in memory, the file is saved shortly after."""
+        config_path = request.get("config_path")
+        if config_path is not None and not isinstance(config_path, str):
+            raise ValueError("config_path must be a string")
+        if config_path is not None and os.path.realpath(config_path) != os.path.realpath(self.config_path):
+            return {"ok": False, "other_config": True, "error": f"the controller uses {self.config_path}"}
+        if request.get("op") == "get":
+            return {"ok": True, "config": self.config}
+        config = apply_request(self.config, request)
+        errors = validate_config(config)
+        if errors:
+            raise ValueError("; ".join(errors))
+        try:
+            self.apply_config(config)
+        except Exception as e:
+            # apply_config() swaps the new state in last, the current config is still whole
+            raise ValueError(f"could not apply the config: {e}")
+        # Only saved once applied, a config that breaks the display never reaches the file
+        self.config_writer.save(config)
+        return {"ok": True}
 
-    def display(self):
+    def update(self):
+        # Cleared first: a snapshot or control request arriving from now on wakes the next idle wait
+        self.metrics.published.clear()
+        with stage_stats.timer("config"):
+            self.control.process(self.handle_control_request)
+            self.reload_config()
+        self.clock = self.scheduler.frame_time
+        self.snapshot = self.metrics.get_metrics(self.renderer.temp_unit)
+        # Includes the "colors" stage
+        with stage_stats.timer("render"):
+            self.frame = self.renderer.frame(self.snapshot, self.clock)
+
+    def next_change_delay(self):
+        """
+        Seconds until the frame can change next without a new metrics snapshot: the next clock
+        tick shown, the next screen of an alternating mode or the next keepalive.
+        None when the frame has to be rendered every update_interval (animated colors, no keepalive).
+        """
+        plans = self.mode.plans()
+        if any(plan.animated for plan in plans) or self.keepalive_interval <= 0:
+            return None
+        delays = [max_idle_sleep, self.last_send_time + self.keepalive_interval - time.monotonic()]
+        resolutions = [plan.time_resolution for plan in plans if plan.time_resolution is not None]
+        if self.mode.clock_resolution is not None:
+            resolutions.append(self.mode.clock_resolution)
+        if resolutions:
+            resolution = min(resolutions)
+            now = datetime.datetime.now()
+            seconds = now.minute * 60 + now.second + now.microsecond / 1e6
+            delays.append(resolution - seconds % resolution)
+        if self.mode.screens > 1:
+            cycle_duration = self.renderer.cycle_duration
+            step = 2 * cycle_duration / self.mode.screens
+            delays.append(step - self.clock % (2 * cycle_duration) % step)
+        return min(delays) + idle_wake_margin
+
+    def wait_next_frame(self):
+        delay = self.next_change_delay() if self.idle_mode else None
+        if delay is None:
+            self.scheduler.wait()
+        else:
+            self.scheduler.idle(delay, self.metrics.published)
+
+    def stats(self):
+        stats = {"stages": stage_stats.summary(), "scheduler": self.scheduler.stats()}
+        if self.writer is not None:
+            stats["hid_writer"] = self.writer.stats()
+        return stats
+
+    def dump_stats(self, signum=None, frame=None):
+        """SIGUSR1 handler: writes the stage timings, scheduler and writer stats as JSON to stats_path."""
+        try:
+            stage_stats.dump(self.stats_path, extra={key: value for key, value in self.stats().items() if key != "stages"})
+            print(f"Stats written to {self.stats_path}")
+        except OSError as e:
+            print(f"Could not write stats to {self.stats_path}: {e}")
+
+    def display(self, stats_interval=None):
+        """Runs the display loop, printing a stage timings summary every stats_interval seconds if set."""
+        next_stats = time.monotonic() + stats_interval if stats_interval else None
         while True:
-            self.config = self.load_config()
+            frame_start = time.perf_counter()
             self.update()
+            if self.writer is not None and self.writer.failed:
+                print("HID device write failed, reopening device.")
+                self.open_device()
             if self.dev is None:
                 print("No device found, with VENDOR_ID: {}, PRODUCT_ID: {}".format(self.VENDOR_ID, self.PRODUCT_ID))
                 time.sleep(5)
+                self.open_device()
+                self.scheduler.reset()
             else:
-                if self.display_mode == "alternate_time":
-                    if self.cpt < self.cycle_duration:
-                        self.display_time()
-                        self.display_metrics(devices=['gpu'])
-                    else:
-                        self.display_time(device="gpu")
-                        self.display_metrics(devices=['cpu'])
-                elif self.display_mode == "metrics":
-                    self.display_metrics(devices=["cpu", "gpu"])
-                elif self.display_mode == "time":
-                    self.display_time_with_seconds()
-                elif self.display_mode == "time_cpu":
-                    self.display_time(device="gpu")
-                    self.display_metrics(devices=['cpu'])
-                elif self.display_mode == "time_gpu":
-                    self.display_time()
-                    self.display_metrics(devices=['gpu'])
-                elif self.display_mode == "alternate_time_with_seconds":
-                    if self.cpt < self.cycle_duration:
-                        self.display_time_with_seconds()
-                    else:
-                        self.display_metrics()
-                elif self.display_mode == "alternate_metrics":
-                    if self.cpt < self.cycle_duration/2:
-                        self.display_temp_small(device='cpu')
-                    elif self.cpt < self.cycle_duration:
-                        self.display_temp_small(device='gpu')
-                    elif self.cpt < 3*self.cycle_duration/2:
-                        self.display_usage_small(device='cpu')
-                    else:
-                        self.display_usage_small(device='gpu')
-                elif self.display_mode == "cpu_temp":
-                    self.display_temp_small(device='cpu')
-                elif self.display_mode == "gpu_temp":
-                    self.display_temp_small(device='gpu')
-                elif self.display_mode == "cpu_usage":
-                    self.display_usage_small(device='cpu')
-                elif self.display_mode == "gpu_usage":
-                    self.display_usage_small(device='gpu')
-                elif self.display_mode == "peerless_standard":
-                    self.display_peerless_standard()
-                elif self.display_mode == "peerless_temp":
-                    self.display_peerless_temp()
-                elif self.display_mode == "peerless_usage":
-                    self.display_peerless_usage()
-                elif self.display_mode == "debug_ui":
-                    self.colors = self.metrics_colors
-                    self.leds[:] = 1
-                else:
-                    print(f"Unknown display mode: {self.display_mode}")
-                
-                self.cpt = (self.cpt + 1) % (self.cycle_duration*2)
                 self.send_packets()
-            time.sleep(self.update_interval)
+            stage_stats.record("frame", time.perf_counter() - frame_start)
+            if next_stats is not None and time.monotonic() >= next_stats:
+                print(stage_stats.summary_line())
+                next_stats = time.monotonic() + stats_interval
+            self.wait_next_frame()
 
 
-def main(config_path):
+def main(config_path, stats_interval=None):
     controller = Controller(config_path=config_path)
-    controller.display()
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, controller.dump_stats)
+    try:
+        controller.display(stats_interval=stats_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if stats_interval:
+            print(stage_stats.summary_line())
+        controller.close()
 
 if __name__ == '__main__':
-    if len(sys.argv) > 1:
-        config_path = sys.argv[1]
-        print(f"Using config path: {config_path}")
+    parser = argparse.ArgumentParser(description="Drives the digital LCD of the cooler.")
+    parser.add_argument("config_path", nargs="?", help="Path to config.json, defaults to DIGITAL_LCD_CONFIG or the repo config.json")
+    parser.add_argument("--stats", nargs="?", type=float, const=10.0, metavar="SECONDS",
+                        help="Print a summary of the per-stage timings every SECONDS (default 10)")
+    args = parser.parse_args()
+    if args.config_path:
+        print(f"Using config path: {args.config_path}")
     else:
         print("No config path provided, using default.")
-        config_path = None
-    main(config_path)
\ No newline at end of file
+    main(args.config_path, stats_interval=args.stats)
\ No newline at end of file
@@ -0,0 +1,166 @@
+import struct
+import time
+
+# Values of the device_backend config key
+device_backends = ["hid", "null", "record"]
+
+# Capture files start with capture_magic, then hold one record per frame: the microseconds
+# since the previous frame (uint32), the number of reports (uint8) and a mask of the reports
+# identical to the same report of the previous frame (uint16, bit i for report i), followed
+# by each other report as its length (uint16) and its bytes. Integers are little-endian.
+capture_magic = b"DLCDCAP\x01"
+_frame_header = struct.Struct("<IBH")
+_report_length = struct.Struct("<H")
+_max_repeated_reports = 16
+
+
+class HidDevice:
+    """The cooler, through hid. hid is only imported when a real device is opened."""
+    def __init__(self, vendor_id, product_id):
+        import hid
+        self.dev = hid.Device(vendor_id, product_id)
+
+    def write_frame(self, reports):
+        for report in reports:
+            self.dev.write(report)
+
+    def close(self):
+        self.dev.close()
+
+
+class NullDevice:
+    """Accepts and discards frames, to run the controller without the cooler."""
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+
+    def write_frame(self, reports):
+        self.frames += 1
+        self.bytes += sum(len(report) for report in reports)
+
+    def close(self):
+        pass
+
+
+class RecordingDevice:
+    """
+    Writes every frame with its time to a capture file, then forwards it to device if there is one.
+    With append, frames are added to an existing capture, the time between the two sessions is dropped.
+    """
+    def __init__(self, path, device=None, append=False):
+        self.path = path
+        self.device = device
+        self.file = open(path, 'ab' if append else 'wb')
+        if self.file.tell() == 0:
+            self.file.write(capture_magic)
+        self.frames = 0
+        self._start = None
+        self._recorded_us = 0
+        self._previous = []
+
+    def write_frame(self, reports):
+        now = time.monotonic()
+        if self._start is None:
+            self._start = now
+        # Relative to the first frame so that rounding errors do not add up
+        elapsed_us = int((now - self._start) * 1e6)
+        delta = min(elapsed_us - self._recorded_us, 0xFFFFFFFF)
+        self._recorded_us += delta
+        repeated = 0
+        changed = []
+        for i, report in enumerate(reports):
+            report = bytes(report)
+            if i < _max_repeated_reports and i < len(self._previous) and self._previous[i] == report:
+                repeated |= 1 << i
+            else:
+                changed.append(_report_length.pack(len(report)) + report)
+        self.file.write(_frame_header.pack(delta, len(reports), repeated) + b"".join(changed))
+        self._previous = [bytes(report) for report in reports]
+        self.frames += 1
+        if self.device is not None:
+            self.device.write_frame(reports)
+
+    def close(self):
+        self.file.close()
+        if self.device is not None:
+            self.device.close()
+
+
+def read_capture(path):
+    """Yields the (seconds since the first frame, reports) of each frame of a capture file."""
+    with open(path, 'rb') as f:
+        if f.read(len(capture_magic)) != capture_magic:
+            raise ValueError(f"{path} is not a capture file")
+        elapsed_us = 0
+        previous = []
+        while True:
+            header = f.read(_frame_header.size)
+            if not header:
+                return
+            if len(header) < _frame_header.size:
+                raise ValueError(f"{path}: truncated frame")
+            delta, count, repeated = _frame_header.unpack(header)
+            elapsed_us += delta
+            reports = []
+            for i in range(count):
+                if repeated >> i & 1:
+                    if i >= len(previous):
+                        raise ValueError(f"{path}: repeated report {i} missing from the previous frame")
+                    reports.append(previous[i])
+                    continue
+                length = f.read(_report_length.size)
+                if len(length) < _report_length.size:
+                    raise ValueError(f"{path}: truncated frame")
+                size = _report_length.unpack(length)[0]
+                report = f.read(size)
+                if len(report) < size:
+                    raise ValueError(f"{path}: truncated frame")
+                reports.append(report)
+            previous = reports
+            yield elapsed_us / 1e6, reports
+
+
+def compare_captures(path, other_path):
+    """
+    Compares the frames of two captures, ignoring their timing. Returns None if they
+    are the same, else the index of the first frame that differs or is missing from one of them.
+    """
+    frames = read_capture(path)
+    other_frames = read_capture(other_path)
+    index = 0
+    while True:
+        frame = next(frames, None)
+        other_frame = next(other_frames, None)
+        if frame is None and other_frame is None:
+            return None
+        if frame is None or other_frame is None or frame[1] != other_frame[1]:
+            return index
+        index += 1
+
+
+def open_device(backend, vendor_id, product_id, capture_path=None, append=False):
+    """
+    Opens the device of a device_backend: the cooler ("hid"), nothing ("null") or the cooler
+    with every frame recorded to capture_path ("record", recording only when there is no cooler).
+    Returns None if the device could not be opened.
+    """
+    if backend == "null":
+        return NullDevice()
+    if backend == "record":
+        device = open_device("hid", vendor_id, product_id)
+        if device is None:
+            print("Recording frames without a device.")
+        try:
+            return RecordingDevice(capture_path, device, append=append)
+        except OSError as e:
+            print(f"Error opening capture file {capture_path}: {e}")
+            if device is not None:
+                device.close()
+            return None
+    if backend != "hid":
+        print(f"Warning: unknown device backend {backend}, using hid.")
+    try:
+        return HidDevice(vendor_id, product_id)
+    except Exception as e:
+        print(f"Error initializing HID device: {e}")
+        return None
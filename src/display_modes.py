@@ -0,0 +1,320 @@
+import datetime
+from functools import partial
+import numpy as np
+from config import NUMBER_OF_LEDS, metric_names
+from stats import stage_stats
+from glyphs import temp_glyphs, usage_glyphs, hour_glyphs, minute_glyphs, frame_glyphs, segment_number_glyphs
+
+
+class DisplayMode:
+    """
+    A display mode compiled for one config and layout: LED indexes, units and color plans
+    are resolved once in __init__, render() only draws the values of the current frame.
+
+    render(snapshot, t) takes the metrics (already in the configured units) and the animation
+    clock in seconds, and returns the LED mask (NUMBER_OF_LEDS,) and colors (NUMBER_OF_LEDS, 3).
+
+    The class attributes describe what the frame depends on, for idle mode and the sampler:
+    clock_resolution is the smallest time unit shown in seconds (None if no clock),
+    screens the number of screens alternated over 2 * cycle_duration,
+    color_keys the color plans used and shown_metrics the metric values drawn.
+    """
+    clock_resolution = None
+    screens = 1
+    color_keys = ("metrics",)
+    shown_metrics = tuple(metric_names)
+
+    def __init__(self, config, leds_indexes, layout, color_plans, cycle_duration):
+        self.leds_indexes = leds_indexes
+        self.layout = layout
+        self.temp_unit = {device: config.get(f"{device}_temperature_unit", "celsius") for device in ["cpu", "gpu"]}
+        self.color_plans = color_plans
+        self.cycle_duration = cycle_duration
+
+    def plans(self):
+        return [self.color_plans[key] for key in self.color_keys]
+
+    def required_metrics(self):
+        """The metrics the frame depends on: the values shown and the ones the color gradients use."""
+        required = set(self.shown_metrics)
+        for plan in self.plans():
+            required |= plan.required_metrics
+        return required
+
+    def colors(self, key, snapshot, t):
+        with stage_stats.timer("colors"):
+            return self.color_plans[key].evaluate(snapshot, t, self.cycle_duration)
+
+    def screen(self, t):
+        """Index of the screen shown at t in the alternating modes."""
+        return int(t % (self.cycle_duration * 2) / (self.cycle_duration * 2 / self.screens))
+
+    def set_leds(self, mask, key, value):
+        try:
+            mask[self.leds_indexes[key]] = value
+        except KeyError:
+            print(f"Warning: Key {key} not found in leds_indexes.")
+
+    def render(self, snapshot, t):
+        raise NotImplementedError
+
+
+class BigLayoutMode(DisplayMode):
+    """Helpers for the two-row layout (leds_indexes): temperature, usage and clock per device."""
+    def __init__(self, config, leds_indexes, layout, color_plans, cycle_duration):
+        super().__init__(config, leds_indexes, layout, color_plans, cycle_duration)
+        self.temp_glyphs = {device: temp_glyphs(tuple(leds_indexes[device+'_temp'])) for device in ["cpu", "gpu"]}
+        self.usage_glyphs = {device: usage_glyphs(tuple(leds_indexes[device+'_usage'])) for device in ["cpu", "gpu"]}
+        self.hour_glyphs = {device: hour_glyphs(tuple(leds_indexes[device+'_temp'])) for device in ["cpu", "gpu"]}
+        self.minute_glyphs = {device: minute_glyphs(tuple(leds_indexes[device+'_usage'])) for device in ["cpu", "gpu"]}
+
+    def set_temp(self, mask, temperature: int, device='cpu', unit="celsius"):
+        if temperature < 1000:
+            self.temp_glyphs[device].draw(mask, temperature)
+            if unit == "celsius":
+                self.set_leds(mask, device + '_celsius', 1)
+            elif unit == "fahrenheit":
+                self.set_leds(mask, device + '_fahrenheit', 1)
+        else:
+            raise Exception("The numbers displayed on the temperature LCD must be less than 1000")
+
+    def set_usage(self, mask, usage : int, device='cpu'):
+        if usage<200:
+            self.usage_glyphs[device].draw(mask, usage)
+            self.set_leds(mask, device+'_percent_led', 1)
+        else:
+            raise Exception("The numbers displayed on the usage LCD must be less than 200")
+
+    def draw_metrics(self, mask, colors, metrics_colors, snapshot, devices=["cpu","gpu"]):
+        for device in devices:
+            self.set_leds(mask, device+"_led", 1)
+            self.set_temp(mask, snapshot[device+"_temp"], device=device, unit=self.temp_unit[device])
+            self.set_usage(mask, snapshot[device+"_usage"], device=device)
+            colors[self.leds_indexes[device]] = metrics_colors[self.leds_indexes[device]]
+
+    def draw_time(self, mask, colors, time_colors, device="cpu"):
+        current_time = datetime.datetime.now()
+        self.hour_glyphs[device].draw(mask, current_time.hour)
+        self.minute_glyphs[device].draw(mask, current_time.minute)
+        colors[self.leds_indexes[device]] = time_colors[self.leds_indexes[device]]
+
+    def draw_time_with_seconds(self, mask):
+        current_time = datetime.datetime.now()
+        self.hour_glyphs['cpu'].draw(mask, current_time.hour)
+        self.minute_glyphs['cpu'].draw(mask, current_time.minute)
+        self.minute_glyphs['gpu'].draw(mask, current_time.second)
+
+
+class MetricsMode(BigLayoutMode):
+    def render(self, snapshot, t):
+        mask = np.zeros(NUMBER_OF_LEDS, dtype=np.uint8)
+        colors = self.colors("metrics", snapshot, t)
+        self.draw_metrics(mask, colors, colors, snapshot)
+        return mask, colors
+
+
+class TimeMode(BigLayoutMode):
+    """Hours, minutes and seconds on the whole display."""
+    clock_resolution = 1
+    color_keys = ("time",)
+    shown_metrics = ()
+
+    def render(self, snapshot, t):
+        mask = np.zeros(NUMBER_OF_LEDS, dtype=np.uint8)
+        self.draw_time_with_seconds(mask)
+        return mask, self.colors("time", snapshot, t)
+
+
+class TimeWithMetricsMode(BigLayoutMode):
+    """The clock on one device row and the metrics of the other device."""
+    clock_resolution = 60
+    color_keys = ("time", "metrics")
+
+    def __init__(self, config, leds_indexes, layout, color_plans, cycle_duration, clock_device="cpu", metrics_device="gpu"):
+        super().__init__(config, leds_indexes, layout, color_plans, cycle_duration)
+        self.clock_device = clock_device
+        self.metrics_device = metrics_device
+        self.shown_metrics = (f"{metrics_device}_temp", f"{metrics_device}_usage")
+
+    def render(self, snapshot, t):
+        mask = np.zeros(NUMBER_OF_LEDS, dtype=np.uint8)
+        colors = self.colors("metrics", snapshot, t)
+        self.draw_time(mask, colors, self.colors("time", snapshot, t), device=self.clock_device)
+        self.draw_metrics(mask, colors, colors, snapshot, devices=[self.metrics_device])
+        return mask, colors
+
+
+class AlternateTimeMode(BigLayoutMode):
+    """The clock and the metrics swap device rows every cycle_duration."""
+    clock_resolution = 60
+    screens = 2
+    color_keys = ("time", "metrics")
+
+    def render(self, snapshot, t):
+        mask = np.zeros(NUMBER_OF_LEDS, dtype=np.uint8)
+        colors = self.colors("metrics", snapshot, t)
+        time_colors = self.colors("time", snapshot, t)
+        if self.screen(t) == 0:
+            self.draw_time(mask, colors, time_colors)
+            self.draw_metrics(mask, colors, colors, snapshot, devices=['gpu'])
+        else:
+            self.draw_time(mask, colors, time_colors, device="gpu")
+            self.draw_metrics(mask, colors, colors, snapshot, devices=['cpu'])
+        return mask, colors
+
+
+class AlternateTimeWithSecondsMode(BigLayoutMode):
+    """The full clock and the metrics of both devices, alternating every cycle_duration."""
+    clock_resolution = 1
+    screens = 2
+    color_keys = ("time", "metrics")
+
+    def render(self, snapshot, t):
+        mask = np.zeros(NUMBER_OF_LEDS, dtype=np.uint8)
+        if self.screen(t) == 0:
+            self.draw_time_with_seconds(mask)
+            return mask, self.colors("time", snapshot, t)
+        colors = self.colors("metrics", snapshot, t)
+        self.draw_metrics(mask, colors, colors, snapshot)
+        return mask, colors
+
+
+class SmallLayoutMode(DisplayMode):
+    """Helpers for the single 3-digit layout (leds_indexes_small)."""
+    def __init__(self, config, leds_indexes, layout, color_plans, cycle_duration):
+        super().__init__(config, leds_indexes, layout, color_plans, cycle_duration)
+        self.frame_glyphs = frame_glyphs(tuple(leds_indexes['digit_frame']))
+
+    def draw_value(self, mask, value):
+        # Only the last 3 digits of larger values fit
+        self.frame_glyphs.draw(mask, value if value < 1000 else value % 1000)
+
+    def draw_temp(self, mask, snapshot, device='cpu'):
+        self.set_leds(mask, self.temp_unit[device], 1)
+        self.set_leds(mask, device+'_led', 1)
+        current_temp = snapshot[f"{device}_temp"]
+        if current_temp is not None:
+            self.draw_value(mask, current_temp)
+        else:
+            print(f"Warning: {device} temperature not available.")
+
+    def draw_usage(self, mask, snapshot, device='cpu'):
+        current_usage = snapshot[f"{device}_usage"]
+        self.set_leds(mask, 'percent_led', 1)
+        self.set_leds(mask, device+'_led', 1)
+        if current_usage is not None:
+            self.draw_value(mask, current_usage)
+        else:
+            print(f"Warning: {device} usage not available.")
+
+
+class SingleMetricMode(SmallLayoutMode):
+    def __init__(self, config, leds_indexes, layout, color_plans, cycle_duration, metric="cpu_temp"):
+        super().__init__(config, leds_indexes, layout, color_plans, cycle_duration)
+        self.device, self.kind = metric.split("_")
+        self.shown_metrics = (metric,)
+
+    def render(self, snapshot, t):
+        mask = np.zeros(NUMBER_OF_LEDS, dtype=np.uint8)
+        if self.kind == "temp":
+            self.draw_temp(mask, snapshot, device=self.device)
+        else:
+            self.draw_usage(mask, snapshot, device=self.device)
+        return mask, self.colors("metrics", snapshot, t)
+
+
+class AlternateMetricsMode(SmallLayoutMode):
+    """CPU temperature, GPU temperature, CPU usage and GPU usage in turn."""
+    screens = 4
+
+    def render(self, snapshot, t):
+        mask = np.zeros(NUMBER_OF_LEDS, dtype=np.uint8)
+        screen = self.screen(t)
+        if screen < 2:
+            self.draw_temp(mask, snapshot, device=["cpu", "gpu"][screen])
+        else:
+            self.draw_usage(mask, snapshot, device=["cpu", "gpu"][screen - 2])
+        return mask, self.colors("metrics", snapshot, t)
+
+
+class PeerlessMode(DisplayMode):
+    """
+    Modes drawn from the segment maps of the compiled layout file. show_temp and show_usage
+    select the fields, reverse_gpu_usage_digits flips the order of the GPU usage digits.
+    """
+    def __init__(self, config, leds_indexes, layout, color_plans, cycle_duration,
+                 show_temp=True, show_usage=True, reverse_gpu_usage_digits=False):
+        super().__init__(config, leds_indexes, layout, color_plans, cycle_duration)
+        self.show_temp = show_temp
+        self.show_usage = show_usage
+        self.shown_metrics = tuple(metric for metric in metric_names
+                                   if (show_temp and metric.endswith("_temp")) or (show_usage and metric.endswith("_usage")))
+        if not self.layout:
+            print("Warning: layout not loaded. Cannot display peerless modes.")
+            return
+        self.temp_glyphs = {}
+        self.usage_glyphs = {}
+        # LEDs lit whatever the values: CPU and GPU LEDs, units and percent signs
+        static_leds = [self.layout['cpu_led'], self.layout['gpu_led']]
+        for device in ["cpu", "gpu"]:
+            self.temp_glyphs[device] = segment_number_glyphs(self.layout.digits[f'{device}_temp_digits'])
+            digits = self.layout.digits[f'{device}_usage_digits']
+            if device == 'gpu' and reverse_gpu_usage_digits:
+                digits = digits[::-1]
+            self.usage_glyphs[device] = segment_number_glyphs(digits, extra=tuple(self.layout[f'{device}_usage_1'].tolist()))
+            if show_temp:
+                static_leds.append(self.layout[f'{device}_celsius' if self.temp_unit[device] == 'celsius' else f'{device}_fahrenheit'])
+            if show_usage:
+                static_leds.append(self.layout[f'{device}_percent'])
+        self.static_leds = np.concatenate(static_leds)
+
+    def render(self, snapshot, t):
+        mask = np.zeros(NUMBER_OF_LEDS, dtype=np.uint8)
+        colors = self.colors("metrics", snapshot, t)
+        if not self.layout:
+            return mask, colors
+        for device in ["cpu", "gpu"]:
+            if self.show_temp:
+                self.temp_glyphs[device].draw(mask, min(snapshot.get(f"{device}_temp", 0), 999))
+            if self.show_usage:
+                # 2 digits, and the "1" for 100% and more
+                usage = snapshot.get(f"{device}_usage", 0)
+                self.usage_glyphs[device].draw(mask, usage % 100 + (100 if usage >= 100 else 0))
+        mask[self.static_leds] = 1
+        return mask, colors
+
+
+class DebugMode(DisplayMode):
+    """Every LED on, to check the colors."""
+    shown_metrics = ()
+
+    def render(self, snapshot, t):
+        return np.ones(NUMBER_OF_LEDS, dtype=np.uint8), self.colors("metrics", snapshot, t)
+
+
+# Display mode name -> factory taking (config, leds_indexes, layout, color_plans, cycle_duration)
+display_mode_registry = {
+    "metrics": MetricsMode,
+    "time": TimeMode,
+    "time_cpu": partial(TimeWithMetricsMode, clock_device="gpu", metrics_device="cpu"),
+    "time_gpu": partial(TimeWithMetricsMode, clock_device="cpu", metrics_device="gpu"),
+    "alternate_time": AlternateTimeMode,
+    "alternate_time_with_seconds": AlternateTimeWithSecondsMode,
+    "alternate_metrics": AlternateMetricsMode,
+    "cpu_temp": partial(SingleMetricMode, metric="cpu_temp"),
+    "gpu_temp": partial(SingleMetricMode, metric="gpu_temp"),
+    "cpu_usage": partial(SingleMetricMode, metric="cpu_usage"),
+    "gpu_usage": partial(SingleMetricMode, metric="gpu_usage"),
+    "peerless_standard": partial(PeerlessMode, reverse_gpu_usage_digits=True),
+    "peerless_temp": partial(PeerlessMode, show_usage=False),
+    "peerless_usage": partial(PeerlessMode, show_temp=False),
+    "debug_ui": DebugMode,
+}
+
+
+def compile_display_mode(name, config, leds_indexes, layout, color_plans, cycle_duration):
+    factory = display_mode_registry.get(name)
+    if factory is None:
+        print(f"Unknown display mode: {name}, using metrics.")
+        factory = display_mode_registry["metrics"]
+    return factory(config, leds_indexes, layout, color_plans, cycle_duration)
@@ -0,0 +1,211 @@
+import json
+import os
+import socket
+import stat
+import struct
+import tempfile
+import time
+
+# Each message is a header (sizes of the JSON part and of the encoded frame, uint32 little-endian),
+# a JSON object (time, metrics, number_of_leds, header as hex) and the encoded frame: the
+# reports sent to the device, back to back (PacketEncoder.buffer).
+_message_header = struct.Struct("<II")
+
+
+def get_runtime_dir():
+    """
+    The directory of the sockets shared by the controller and its clients. It only depends on
+    the user, not on the session environment: the systemd service has no XDG_RUNTIME_DIR, and
+    /run/user/<uid> may not exist yet when it starts. Created private to the user on first use.
+    """
+    if not hasattr(os, 'getuid'):
+        return tempfile.gettempdir()
+    path = f'/tmp/digital_lcd-{os.getuid()}'
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    except OSError as e:
+        print(f"Warning: could not create {path}: {e}")
+        return tempfile.gettempdir()
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        print(f"Warning: {path} is not a directory of this user, using {tempfile.gettempdir()} instead.")
+        return tempfile.gettempdir()
+    return path
+
+
+def get_socket_path():
+    """The Unix socket the controller publishes its frames on."""
+    default = os.path.join(get_runtime_dir(), 'digital_lcd_frames.sock')
+    return os.environ.get('DIGITAL_LCD_FRAME_SOCKET', default)
+
+
+def encode_message(buffer, metrics, number_of_leds, header):
+    info = json.dumps({
+        "time": time.time(),
+        "metrics": dict(metrics),
+        "number_of_leds": number_of_leds,
+        "header": header.hex(),
+    }).encode()
+    return _message_header.pack(len(info), len(buffer)) + info + bytes(buffer)
+
+
+class FramePublisher:
+    """
+    Sends every frame written to the device, with its metrics snapshot, to the processes
+    connected to a Unix socket (e.g. the UI mirror). Never blocks the render loop: new
+    subscribers are accepted on publish(), and a subscriber that does not keep up misses
+    frames instead of buffering them. Publishing costs nothing but a failed accept() while
+    no one is subscribed.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.subscribers = {}  # socket -> bytes not sent yet
+        self.server = None
+        if not hasattr(socket, "AF_UNIX"):
+            print("Warning: Unix sockets are not available, frames will not be published.")
+            return
+        if os.path.exists(path):
+            if is_listening(path):
+                print(f"Warning: {path} is used by another process, frames will not be published.")
+                return
+            os.unlink(path)
+        try:
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            server.bind(path)
+            server.listen(4)
+            server.setblocking(False)
+        except OSError as e:
+            print(f"Warning: could not publish frames on {path}: {e}")
+            return
+        self.server = server
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                # BlockingIOError when there is no new subscriber
+                return
+            client.setblocking(False)
+            self.subscribers[client] = b""
+
+    def _send(self, client, data):
+        try:
+            sent = client.send(data)
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except OSError:
+            self._drop(client)
+            return
+        self.subscribers[client] = data[sent:]
+
+    def _drop(self, client):
+        self.subscribers.pop(client, None)
+        client.close()
+
+    def publish(self, buffer, metrics, number_of_leds, header):
+        if self.server is None:
+            return
+        self._accept()
+        if not self.subscribers:
+            return
+        message = None
+        for client, pending in list(self.subscribers.items()):
+            if pending:
+                # Finish the previous message first, this frame is skipped if it is still not sent
+                self._send(client, pending)
+                if client not in self.subscribers or self.subscribers[client]:
+                    continue
+            if message is None:
+                message = encode_message(buffer, metrics, number_of_leds, header)
+            self._send(client, message)
+
+    def close(self):
+        for client in list(self.subscribers):
+            self._drop(client)
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+def is_listening(path):
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        client.close()
+
+
+class FrameSubscriber:
+    """
+    Receives the frames of a FramePublisher without blocking: poll() returns the latest
+    complete message, as (info, encoded frame), or None if there is no new one.
+    Reconnects at most every retry_interval seconds while the controller is not running.
+    """
+    def __init__(self, path, retry_interval=1.0):
+        self.path = path
+        self.retry_interval = retry_interval
+        self.sock = None
+        self.data = b""
+        self.next_retry = 0.0
+        self.connect()
+
+    @property
+    def connected(self):
+        return self.sock is not None
+
+    def connect(self):
+        self.next_retry = time.monotonic() + self.retry_interval
+        if not hasattr(socket, "AF_UNIX"):
+            return False
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            return False
+        sock.setblocking(False)
+        self.sock = sock
+        self.data = b""
+        return True
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def poll(self):
+        if self.sock is None:
+            if time.monotonic() < self.next_retry or not self.connect():
+                return None
+        while True:
+            try:
+                chunk = self.sock.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                chunk = b""
+            if not chunk:
+                # The controller stopped
+                self.close()
+                break
+            self.data += chunk
+        latest = None
+        while len(self.data) >= _message_header.size:
+            info_size, frame_size = _message_header.unpack_from(self.data)
+            end = _message_header.size + info_size + frame_size
+            if len(self.data) < end:
+                break
+            info = json.loads(self.data[_message_header.size:_message_header.size + info_size])
+            latest = (info, self.data[_message_header.size + info_size:end])
+            self.data = self.data[end:]
+        return latest
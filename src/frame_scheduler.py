@@ -0,0 +1,87 @@
+import time
+
+
+class FrameScheduler:
+    """
+    Paces the render loop on absolute time.monotonic() deadlines (start + n * interval)
+    instead of sleeping a fixed interval after each frame, so the time spent sampling,
+    rendering and writing does not stretch the frame period. A frame that is late by a
+    whole period or more is skipped rather than queued: the next deadline is the first
+    one still ahead.
+    """
+    def __init__(self, interval):
+        self.interval = interval
+        self.start_time = time.monotonic()
+        self.next_deadline = self.start_time
+        self.frames = 0
+        self.idle_frames = 0
+        self.missed_deadlines = 0
+        self.last_jitter = 0.0
+        self.max_jitter = 0.0
+        self.total_jitter = 0.0
+
+    def reset(self):
+        """Restarts the deadlines from now without counting misses, e.g. after waiting for the device."""
+        self.next_deadline = time.monotonic()
+
+    def set_interval(self, interval):
+        # Deadlines are relative to the previous one, a new interval applies from the next frame
+        self.interval = interval
+
+    @property
+    def frame_time(self):
+        """Animation clock in seconds: the deadline of the current frame, not the time it actually woke up."""
+        return self.next_deadline - self.start_time
+
+    def wait(self):
+        """Sleeps until the next frame deadline."""
+        self.next_deadline += self.interval
+        now = time.monotonic()
+        if now < self.next_deadline:
+            time.sleep(self.next_deadline - now)
+            now = time.monotonic()
+        lateness = now - self.next_deadline
+        if lateness >= self.interval:
+            missed = int(lateness // self.interval)
+            self.missed_deadlines += missed
+            self.next_deadline += missed * self.interval
+            lateness -= missed * self.interval
+        jitter = abs(lateness)
+        self.frames += 1
+        self.last_jitter = jitter
+        self.max_jitter = max(self.max_jitter, jitter)
+        self.total_jitter += jitter
+
+    def idle(self, delay, event=None):
+        """
+        Sleeps delay seconds or until event is set, whichever comes first, but no less than
+        until the next regular deadline. The deadlines restart from the wake-up time.
+        """
+        earliest = self.next_deadline + self.interval
+        if event is not None:
+            event.wait(max(delay, 0))
+        elif delay > 0:
+            time.sleep(delay)
+        now = time.monotonic()
+        if now < earliest:
+            time.sleep(earliest - now)
+            now = time.monotonic()
+        self.next_deadline = now
+        self.frames += 1
+        self.idle_frames += 1
+
+    def wakeups_per_second(self):
+        elapsed = time.monotonic() - self.start_time
+        return self.frames / elapsed if elapsed > 0 else 0.0
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "frames": self.frames,
+            "idle_frames": self.idle_frames,
+            "wakeups_per_second": round(self.wakeups_per_second(), 3),
+            "missed_deadlines": self.missed_deadlines,
+            "last_jitter_ms": round(self.last_jitter * 1000, 3),
+            "avg_jitter_ms": round(self.total_jitter / (self.frames - self.idle_frames) * 1000, 3) if self.frames > self.idle_frames else 0.0,
+            "max_jitter_ms": round(self.max_jitter * 1000, 3),
+        }
@@ -0,0 +1,127 @@
+from functools import lru_cache
+import numpy as np
+
+
+digit_to_segments = {
+    0: ['a', 'b', 'c', 'd', 'e', 'f'],
+    1: ['b', 'c'],
+    2: ['a', 'b', 'g', 'e', 'd'],
+    3: ['a', 'b', 'g', 'c', 'd'],
+    4: ['f', 'g', 'b', 'c'],
+    5: ['a', 'f', 'g', 'c', 'd'],
+    6: ['a', 'f', 'g', 'e', 'c', 'd'],
+    7: ['a', 'b', 'c'],
+    8: ['a', 'b', 'c', 'd', 'e', 'f', 'g'],
+    9: ['a', 'b', 'g', 'f', 'c', 'd'],
+}
+segment_names = "abcdefg"
+
+digit_mask = np.array(
+    [
+        [1, 1, 1, 1, 1, 1, 1],  # 0
+        [1, 1, 1, 1, 1, 1, 1],  # 1
+        [1, 1, 1, 1, 1, 1, 1],  # 2
+        [1, 1, 1, 1, 1, 1, 1],  # 3
+        [1, 1, 1, 1, 1, 1, 1],  # 4
+        [1, 1, 1, 1, 1, 1, 1],  # 5
+        [1, 1, 1, 1, 1, 1, 1],  # 6
+        [1, 1, 1, 1, 1, 1, 1],  # 7
+        [1, 1, 1, 1, 1, 1, 1],  # 8
+        [1, 1, 1, 1, 1, 1, 1],  # 9
+        [1, 1, 1, 1, 1, 1, 1],  # nothing
+    ]
+)
+
+letter_mask = {
+    'H': [1, 0, 1, 1, 1, 0, 1],
+}
+
+
+def _number_to_array(number):
+    if number>=10:
+        return _number_to_array(int(number/10))+[number%10]
+    else:
+        return [number]
+
+def get_number_array(temp, array_length=3, fill_value=-1):
+    if temp<0:
+        return [fill_value]*array_length
+    else:
+        narray = _number_to_array(temp)
+        if (len(narray)!=array_length):
+            if(len(narray)<array_length):
+                narray = np.concatenate([[fill_value]*(array_length-len(narray)),narray])
+            else:
+                narray = narray[1:]
+        return narray
+
+
+class GlyphTable:
+    """
+    The LEDs lit by every value of one display field, built once per layout.
+    Drawing a value is a single fancy-index assignment into the LED mask.
+    Negative values draw the negative glyph.
+    """
+    def __init__(self, lit, negative):
+        self.lit = lit
+        self.negative = negative
+
+    def draw(self, mask, value):
+        mask[self.lit[value] if value >= 0 else self.negative] = 1
+
+    def __len__(self):
+        return len(self.lit)
+
+
+def _pattern_table(indexes, pattern, size):
+    """Table for a field of leds_indexes: pattern(value) gives the on/off state of each of its LEDs."""
+    indexes = np.array(indexes, dtype=np.intp)
+    lit = [indexes[np.flatnonzero(pattern(value))] for value in range(size)]
+    return GlyphTable(lit, indexes[np.flatnonzero(pattern(-1))])
+
+
+# Fields of leds_indexes/leds_indexes_small, indexes are passed as tuples so that tables are cached
+@lru_cache(maxsize=None)
+def temp_glyphs(indexes):
+    """3-digit temperature of the big layout, 0 to 999."""
+    return _pattern_table(indexes, lambda value: digit_mask[get_number_array(value)].flatten(), 1000)
+
+@lru_cache(maxsize=None)
+def usage_glyphs(indexes):
+    """Usage of the big layout: the leading "1" LEDs and 2 digits, 0 to 199."""
+    return _pattern_table(indexes, lambda value: np.concatenate(([int(value>=100)]*2,digit_mask[get_number_array(value, array_length=2)].flatten())), 200)
+
+@lru_cache(maxsize=None)
+def hour_glyphs(indexes):
+    """Hours and the H letter in a temperature field of the big layout."""
+    return _pattern_table(indexes, lambda value: np.concatenate((digit_mask[get_number_array(value, array_length=2, fill_value=0)].flatten(),letter_mask["H"])), 24)
+
+@lru_cache(maxsize=None)
+def minute_glyphs(indexes):
+    """Minutes or seconds in a usage field of the big layout."""
+    return _pattern_table(indexes, lambda value: np.concatenate(([0,0],digit_mask[get_number_array(value, array_length=2, fill_value=0)].flatten())), 60)
+
+@lru_cache(maxsize=None)
+def frame_glyphs(indexes):
+    """3-digit number of the small layout digit frame, 0 to 999."""
+    return _pattern_table(indexes, lambda value: digit_mask[get_number_array(value, array_length=3, fill_value=0)].flatten(), 1000)
+
+
+@lru_cache(maxsize=None)
+def segment_number_glyphs(maps, extra=None):
+    """
+    Zero-padded numbers on layout file digits, 0 to 10**digits - 1. maps has one tuple per digit
+    with the LEDs of its segments in segment_names order (CompiledLayout.digits).
+    With extra, a tuple of LEDs such as the leading "1" of the usage fields,
+    values from 10**digits up to 2 * 10**digits - 1 also light those LEDs.
+    """
+    num_digits = len(maps)
+    lit = []
+    for value in range(10 ** num_digits * (2 if extra else 1)):
+        leds = [maps[i][segment_names.index(segment)]
+                for i, digit_char in enumerate(f"{value % 10 ** num_digits:0{num_digits}d}")
+                for segment in digit_to_segments[int(digit_char)]]
+        if value >= 10 ** num_digits:
+            leds.extend(extra)
+        lit.append(np.array(leds, dtype=np.intp))
+    return GlyphTable(lit, lit[0])
@@ -0,0 +1,144 @@
+import functools
+import math
+import numpy as np
+
+# Entries per loop for cycle and wave animations
+CYCLE_LUT_SIZE = 256
+
+# Metric tables only cover the values the 3-digit display can show, whatever the configured
+# range, so that a huge range (e.g. a max of 1e12) does not build a huge table. Values
+# outside are clamped to the edge entries, like values outside the range.
+METRIC_VALUE_LIMITS = (-999, 999)
+
+
+def _lerp(start, end, factor):
+    """Same blend as utils.interpolate_color, for (k, 3) color arrays and k factors."""
+    factor = np.asarray(factor, dtype=float)[:, None]
+    return (np.asarray(start, dtype=float) * (1 - factor) + np.asarray(end, dtype=float) * factor).astype(np.uint8)
+
+
+def _freeze(table):
+    # Tables are shared between every LED and every plan using the same gradient
+    table.setflags(write=False)
+    return table
+
+
+@functools.lru_cache(maxsize=None)
+def linear_lut(start, end, size):
+    """
+    Two-color gradient sampled at factors k / (size - 1).
+    With size 60/60/24 the entry index is directly the second/minute/hour.
+    """
+    factors = np.arange(size) / (size - 1)
+    return _freeze(_lerp(np.tile(start, (size, 1)), np.tile(end, (size, 1)), factors))
+
+
+@functools.lru_cache(maxsize=None)
+def metric_lut(start, end, min_value, max_value):
+    """
+    Two-color gradient over integer metric values, entry k is for value metric_domain(...)[0] + k.
+    Values outside the table are clamped, like the factor. With min_value > max_value the
+    gradient is reversed: start_color at min_value, end_color at max_value all the same.
+    """
+    low, high = metric_domain(min_value, max_value)
+    values = np.arange(low, high + 1)
+    factors = np.clip((values - min_value) / (max_value - min_value), 0, 1)
+    return _freeze(_lerp(np.tile(start, (len(values), 1)), np.tile(end, (len(values), 1)), factors))
+
+
+def metric_domain(min_value, max_value):
+    low, high = _clamp_domain(min(min_value, max_value), max(min_value, max_value))
+    return math.floor(low), math.ceil(high)
+
+
+def _clamp_domain(low, high):
+    # Clamped before any rounding, the configured values can be as large as 1e308 or inf
+    lowest, highest = METRIC_VALUE_LIMITS
+    return min(max(low, lowest), highest), max(min(high, highest), lowest)
+
+
+def stops_domain(stops):
+    """First and last metric value of the stops_lut table."""
+    return _clamp_domain(stops[0][0], stops[-1][0])
+
+
+@functools.lru_cache(maxsize=None)
+def stops_lut(stops):
+    """
+    Multi-stop gradient over integer metric values, from the first to the last stop value
+    (see stops_domain). stops is a sorted tuple of (value, (r, g, b)).
+    """
+    values = np.array([value for value, _ in stops])
+    colors = np.array([color for _, color in stops], dtype=float)
+    low, high = stops_domain(stops)
+    samples = np.arange(low, high + 1)
+    # Index of the last stop <= sample, so that each sample lies in [values[j], values[j + 1])
+    j = np.clip(np.searchsorted(values, samples, side='right') - 1, 0, len(values) - 2)
+    span = values[j + 1] - values[j]
+    factors = np.where(span > 0, (samples - values[j]) / np.where(span > 0, span, 1), 1)
+    table = _lerp(colors[j], colors[j + 1], np.clip(factors, 0, 1))
+    if low == values[0]:
+        table[0] = colors[0]
+    if high == values[-1]:
+        table[-1] = colors[-1]
+    return _freeze(table)
+
+
+@functools.lru_cache(maxsize=None)
+def cycle_lut(colors, size=CYCLE_LUT_SIZE):
+    """
+    Closed loop through colors (the last color must equal the first), entry k is at k / size of the loop.
+    """
+    colors = np.array(colors, dtype=float)
+    num_segments = len(colors) - 1
+    time_in_cycle = np.arange(size) / size
+    segment_duration = 1 / num_segments
+    segment = np.minimum((time_in_cycle / segment_duration).astype(np.intp), num_segments - 1)
+    factors = (time_in_cycle - segment * segment_duration) / segment_duration
+    return _freeze(_lerp(colors[segment], colors[segment + 1], factors))
+
+
+class LookupGroup:
+    """
+    LEDs whose color is a table lookup. The tables of all LEDs are concatenated
+    once (each distinct table only once) so a frame is a single fancy index.
+    """
+    def __init__(self):
+        self.indexes = []
+        self.offsets = []
+        self.lows = []
+        self.sizes = []
+        self.codes = []
+        self._tables = []
+        self._table_offsets = {}
+        self._length = 0
+
+    def add(self, index, table, low=0, code=0):
+        offset = self._table_offsets.get(id(table))
+        if offset is None:
+            offset = self._length
+            self._table_offsets[id(table)] = offset
+            self._tables.append(table)
+            self._length += len(table)
+        self.indexes.append(index)
+        self.offsets.append(offset)
+        self.lows.append(low)
+        self.sizes.append(len(table))
+        self.codes.append(code)
+
+    def compile(self):
+        self.indexes = np.array(self.indexes, dtype=np.intp)
+        self.offsets = np.array(self.offsets, dtype=np.intp)
+        self.lows = np.array(self.lows, dtype=np.intp)
+        self.sizes = np.array(self.sizes, dtype=np.intp)
+        self.codes = np.array(self.codes, dtype=np.intp)
+        self.table = np.concatenate(self._tables) if self._tables else np.zeros((0, 3), dtype=np.uint8)
+        del self._tables, self._table_offsets
+        return self
+
+    def lookup(self, positions):
+        """positions are per-LED integer positions in each LED's table domain."""
+        return self.table[self.offsets + np.clip(positions - self.lows, 0, self.sizes - 1)]
+
+    def __len__(self):
+        return len(self.indexes)
@@ -0,0 +1,82 @@
+import threading
+import time
+from stats import stage_stats
+
+
+class HidWriter:
+    """
+    Owns the device (see devices.py) and writes frames from a dedicated thread so that
+    the render loop never blocks on USB. Frames go through a single-slot mailbox:
+    a frame that has not been picked up yet is replaced by the newer one.
+    """
+    def __init__(self, dev):
+        self.dev = dev
+        self.failed = False  # Set after a write error, the device has to be reopened
+        self.frames_submitted = 0
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.write_errors = 0
+        self.last_write_latency = 0.0
+        self.max_write_latency = 0.0
+        self.total_write_time = 0.0
+        self._pending = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="hid-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, reports):
+        """Queues the reports of one frame (a list of bytes), replacing any frame not yet written."""
+        with self._condition:
+            if self._pending is not None:
+                self.frames_dropped += 1
+            self._pending = reports
+            self.frames_submitted += 1
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                reports = self._pending
+                self._pending = None
+            start = time.perf_counter()
+            try:
+                self.dev.write_frame(reports)
+            except Exception as e:
+                self.write_errors += 1
+                if not self.failed:
+                    print(f"Error writing to HID device: {e}")
+                self.failed = True
+                continue
+            latency = time.perf_counter() - start
+            self.frames_written += 1
+            self.last_write_latency = latency
+            self.max_write_latency = max(self.max_write_latency, latency)
+            self.total_write_time += latency
+            stage_stats.record("hid_write", latency)
+
+    def stats(self):
+        written = self.frames_written
+        return {
+            "frames_submitted": self.frames_submitted,
+            "frames_written": written,
+            "frames_dropped": self.frames_dropped,
+            "write_errors": self.write_errors,
+            "last_write_latency_ms": self.last_write_latency * 1000,
+            "avg_write_latency_ms": (self.total_write_time / written * 1000) if written else 0.0,
+            "max_write_latency_ms": self.max_write_latency * 1000,
+        }
+
+    def close(self, timeout=1.0):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(timeout)
+        try:
+            self.dev.close()
+        except Exception:
+            pass
@@ -0,0 +1,104 @@
+import glob
+import os
+
+# (hwmon name, temperature label) in order of preference, None takes the first temperature
+cpu_temp_sensors = [
+    ("k10temp", "Tctl"),
+    ("coretemp", "Package id 0"),
+    ("cpu_thermal", None),
+    ("acpitz", None),
+]
+
+
+class HwmonBackend:
+    """
+    CPU and AMD GPU sensors read straight from sysfs. The sensor files are resolved
+    once and kept open, each sample is a single os.pread instead of walking
+    /sys/class/hwmon (psutil.sensors_temperatures) or reopening a file.
+    sysfs_root can point to a fake tree for testing.
+    """
+    def __init__(self, sysfs_root="/sys", amd_gpu_temp_sensor="edge"):
+        self.sysfs_root = sysfs_root
+        self._fds = {}
+        self.cpu_temp_path = self._find_cpu_temp()
+        amdgpu = self._find_hwmon("amdgpu")
+        self.gpu_temp_path = self._find_temp_input(amdgpu, amd_gpu_temp_sensor) if amdgpu else None
+        busy = os.path.join(amdgpu, "device", "gpu_busy_percent") if amdgpu else None
+        self.gpu_usage_path = busy if busy and os.path.exists(busy) else None
+
+    def _hwmon_dirs(self):
+        return sorted(glob.glob(os.path.join(self.sysfs_root, "class", "hwmon", "hwmon*")),
+                      key=lambda path: int(path.rsplit("hwmon", 1)[1] or 0))
+
+    def _find_hwmon(self, name):
+        for directory in self._hwmon_dirs():
+            if _read_text(os.path.join(directory, "name")) == name:
+                return directory
+        return None
+
+    def _find_temp_input(self, directory, label):
+        inputs = sorted(glob.glob(os.path.join(directory, "temp*_input")),
+                        key=lambda path: int(os.path.basename(path)[4:-6] or 0))
+        if label is None:
+            return inputs[0] if inputs else None
+        for path in inputs:
+            if _read_text(path[:-len("_input")] + "_label") == label:
+                return path
+        return None
+
+    def _find_cpu_temp(self):
+        for name, label in cpu_temp_sensors:
+            directory = self._find_hwmon(name)
+            if directory:
+                path = self._find_temp_input(directory, label)
+                if path:
+                    return path
+        thermal_zone = os.path.join(self.sysfs_root, "class", "thermal", "thermal_zone0", "temp")
+        return thermal_zone if os.path.exists(thermal_zone) else None
+
+    def _read_int(self, path):
+        if path is None:
+            return None
+        fd = self._fds.get(path)
+        try:
+            if fd is None:
+                fd = os.open(path, os.O_RDONLY)
+                self._fds[path] = fd
+            # sysfs regenerates the attribute on every read at offset 0
+            return int(os.pread(fd, 32, 0))
+        except (OSError, ValueError):
+            # The device may have gone away (driver reload...), reopen on the next sample
+            self._fds.pop(path, None)
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+            return None
+
+    def get_cpu_temp(self):
+        value = self._read_int(self.cpu_temp_path)
+        return None if value is None else value / 1000.0
+
+    def get_gpu_temp(self):
+        value = self._read_int(self.gpu_temp_path)
+        return None if value is None else value / 1000.0
+
+    def get_gpu_usage(self):
+        return self._read_int(self.gpu_usage_path)
+
+    def close(self):
+        for fd in self._fds.values():
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self._fds = {}
+
+
+def _read_text(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
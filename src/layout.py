@@ -0,0 +1,109 @@
+import json
+import os
+from functools import lru_cache
+import numpy as np
+from config import NUMBER_OF_LEDS, leds_indexes, leds_indexes_small, layout_files
+from glyphs import segment_names
+
+# Fields of the leds_indexes tables that group other fields, they are allowed to overlap
+group_fields = ("all", "cpu", "gpu")
+
+index_tables = {
+    "big": leds_indexes,
+    "small": leds_indexes_small,
+}
+
+
+def _check_leds(leds, field, used, number_of_leds):
+    for led in leds:
+        if not isinstance(led, (int, np.integer)) or isinstance(led, bool):
+            raise ValueError(f"{field}: LED index {led!r} is not an integer")
+        if not 0 <= led < number_of_leds:
+            raise ValueError(f"{field}: LED index {led} out of range for {number_of_leds} LEDs")
+        if used is not None:
+            if led in used:
+                raise ValueError(f"{field}: LED {led} already used by {used[led]}")
+            used[led] = field
+
+
+class CompiledLayout:
+    """
+    A layout.json segment mapping checked and turned into index arrays.
+    fields maps every field (cpu_led, cpu_celsius, cpu_usage_1, cpu_temp_digits...) to the
+    LED indexes it covers, digits maps every *_digits field to one segment map per digit:
+    the LEDs of its segments in segment_names order, as expected by the glyph tables.
+    Each LED can only belong to one field.
+    """
+    def __init__(self, layout, number_of_leds=NUMBER_OF_LEDS, name="layout"):
+        if not isinstance(layout, dict):
+            raise ValueError(f"{name} is not a JSON object")
+        self.name = name
+        self.fields = {}
+        self.digits = {}
+        used = {}
+        for field, value in layout.items():
+            if field == "comment":
+                continue
+            if field.endswith("_digits"):
+                maps = []
+                for i, digit in enumerate(value):
+                    missing = [segment for segment in segment_names if segment not in digit['map']]
+                    if missing:
+                        raise ValueError(f"{field}[{i}]: missing segments {missing}")
+                    segment_map = tuple(digit['map'][segment] for segment in segment_names)
+                    if 'segments' in digit and sorted(digit['segments']) != sorted(segment_map):
+                        raise ValueError(f"{field}[{i}]: segments and map do not list the same LEDs")
+                    maps.append(segment_map)
+                self.digits[field] = tuple(maps)
+                leds = [led for segment_map in maps for led in segment_map]
+            elif isinstance(value, dict):
+                leds = list(value.values())
+            elif isinstance(value, list):
+                leds = value
+            else:
+                leds = [value]
+            _check_leds(leds, f"{name}: {field}", used, number_of_leds)
+            self.fields[field] = np.array(leds, dtype=np.intp)
+
+    def __getitem__(self, field):
+        return self.fields[field]
+
+
+def compile_index_table(table, number_of_leds=NUMBER_OF_LEDS, name="leds_indexes"):
+    """A leds_indexes style table with every field as an index array, checked like layout files."""
+    compiled = {}
+    used = {}
+    for field, value in table.items():
+        leds = value if isinstance(value, list) else [value]
+        _check_leds(leds, f"{name}: {field}", None if field in group_fields else used, number_of_leds)
+        compiled[field] = np.array(leds, dtype=np.intp)
+    return compiled
+
+
+@lru_cache(maxsize=None)
+def get_index_table(layout_mode):
+    """The compiled leds_indexes table of a layout_mode ("big" or "small")."""
+    return compile_index_table(index_tables[layout_mode], name=f"{layout_mode} leds_indexes")
+
+
+def get_layout_path(config, product_id):
+    """The layout file set in the config (layout_file), or the one known for the product, relative to the repo root."""
+    name = config.get('layout_file') or layout_files.get(product_id, "layout.json")
+    if os.path.isabs(name):
+        return name
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), name)
+
+
+@lru_cache(maxsize=8)
+def _compile_layout_file(path, mtime_ns):
+    with open(path, 'r') as f:
+        return CompiledLayout(json.load(f), name=os.path.basename(path))
+
+
+def load_layout(path):
+    """The compiled layout file, compiled again only when the file changes. None if it is missing or invalid."""
+    try:
+        return _compile_layout_file(os.path.abspath(path), os.stat(path).st_mtime_ns)
+    except Exception as e:
+        print(f"Error loading layout: {e}")
+        return None
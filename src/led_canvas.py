@@ -0,0 +1,159 @@
+import tkinter as tk
+from collections import namedtuple
+import numpy as np
+from utils import rgb_to_hex
+
+# Order of the LEDs of each digit in the leds_indexes fields
+segment_order = ("top_left", "top", "top_right", "middle", "bottom_left", "bottom", "bottom_right")
+
+# One LED drawn on the canvas: a polygon (coords) or a text, for leds_indexes[key][index]
+Shape = namedtuple("Shape", ["led", "key", "index", "coords", "text"])
+
+
+def _bar(x0, y0, x1, y1, thickness, gap):
+    """Hexagonal segment from (x0, y0) to (x1, y1), which is either horizontal or vertical."""
+    t = thickness / 2
+    if y0 == y1:
+        x0, x1 = x0 + gap, x1 - gap
+        return [x0, y0, x0 + t, y0 - t, x1 - t, y0 - t, x1, y0, x1 - t, y0 + t, x0 + t, y0 + t]
+    y0, y1 = y0 + gap, y1 - gap
+    return [x0, y0, x0 + t, y0 + t, x0 + t, y1 - t, x0, y1, x0 - t, y1 - t, x0 - t, y0 + t]
+
+
+class LayoutGeometry:
+    """
+    Builds the shapes of a layout, in pixels. Fields and indexes are those of leds_indexes,
+    the ones it does not have are skipped.
+    """
+    def __init__(self, leds_indexes, digit_size=16, thickness=5):
+        self.leds_indexes = leds_indexes
+        self.digit_size = digit_size
+        self.thickness = thickness
+        self.shapes = []
+
+    def led(self, key, index):
+        leds = self.leds_indexes.get(key)
+        if isinstance(leds, list):
+            return leds[index] if index is not None and index < len(leds) else None
+        return leds
+
+    def _add(self, key, index, coords=None, text=None):
+        led = self.led(key, index)
+        if led is not None:
+            self.shapes.append(Shape(led, key, index, coords, text))
+
+    def text(self, key, index, x, y, text):
+        self._add(key, index, coords=[x, y], text=text)
+
+    def bar(self, key, index, x0, y0, x1, y1):
+        self._add(key, index, coords=_bar(x0, y0, x1, y1, self.thickness, self.thickness / 4))
+
+    def digits(self, key, x, y, count, first=0):
+        """count 7-segment digits from (x, y), using the LEDs of key from index first. Returns the x after them."""
+        s = self.digit_size
+        index = first
+        for _ in range(count):
+            bars = {
+                "top_left": (x, y, x, y + s),
+                "top": (x, y, x + s, y),
+                "top_right": (x + s, y, x + s, y + s),
+                "middle": (x, y + s, x + s, y + s),
+                "bottom_left": (x, y + s, x, y + 2 * s),
+                "bottom": (x, y + 2 * s, x + s, y + 2 * s),
+                "bottom_right": (x + s, y + s, x + s, y + 2 * s),
+            }
+            for name in segment_order:
+                self.bar(key, index, *bars[name])
+                index += 1
+            x += s + 2 * self.thickness + 4
+        return x
+
+
+def big_layout_geometry(leds_indexes):
+    """The big layout: per device its letters, temperature and unit, usage and percent sign."""
+    geometry = LayoutGeometry(leds_indexes)
+    s = geometry.digit_size
+    for row, device in enumerate(["cpu", "gpu"]):
+        y = 15 + row * (2 * s + 30)
+        geometry.text(device + "_led", int(device == "cpu"), 20, y + s, device.upper()[0])
+        geometry.text(device + "_led", int(device != "cpu"), 45, y + s, device.upper()[1:])
+        x = geometry.digits(device + "_temp", 75, y, 3)
+        geometry.text(device + "_celsius", None, x + 5, y + s / 2, "°C")
+        geometry.text(device + "_fahrenheit", None, x + 5, y + 3 * s / 2, "°F")
+        x += 30
+        # The leading "1" of the usage, bottom bar first
+        geometry.bar(device + "_usage", 0, x, y + s, x, y + 2 * s)
+        geometry.bar(device + "_usage", 1, x, y, x, y + s)
+        x = geometry.digits(device + "_usage", x + 15, y, 2, first=2)
+        geometry.text(device + "_percent_led", None, x + 5, y + s, "%")
+    return geometry.shapes
+
+
+def small_layout_geometry(leds_indexes):
+    """The small layout: device letters, units and the 3-digit frame."""
+    geometry = LayoutGeometry(leds_indexes)
+    s = geometry.digit_size
+    geometry.text("cpu_led", 0, 25, 15 + s / 2, "CP")
+    geometry.text("cpu_led", 1, 50, 15 + s / 2, "U")
+    geometry.text("gpu_led", 0, 25, 15 + 3 * s / 2, "GP")
+    geometry.text("gpu_led", 1, 50, 15 + 3 * s / 2, "U")
+    geometry.text("celsius", None, 80, 15 + s / 3, "°C")
+    geometry.text("fahrenheit", None, 80, 15 + s, "°F")
+    geometry.text("percent_led", None, 80, 15 + 5 * s / 3, "%")
+    geometry.digits("digit_frame", 105, 15, 3)
+    return geometry.shapes
+
+
+class LedCanvas(tk.Canvas):
+    """
+    The LEDs of a layout drawn on a single canvas. set_geometry() replaces the shapes,
+    show() takes an RGB uint8 frame and only recolors the LEDs that changed, with itemconfig.
+    Off LEDs are drawn in off_color. on_click(key, index) is called when an LED is clicked.
+    """
+    def __init__(self, parent, on_click=None, off_color="#1e1e1e", font=("Arial", 16, "bold"), **kwargs):
+        kwargs.setdefault("background", "black")
+        kwargs.setdefault("highlightthickness", 0)
+        super().__init__(parent, **kwargs)
+        self.on_click = on_click
+        self.off_color = off_color
+        self.font = font
+        self.items = []  # Canvas items of each LED
+        self.shown = None  # Last frame shown, None after set_geometry()
+
+    def set_geometry(self, shapes, number_of_leds, padding=10):
+        self.delete("all")
+        self.items = [[] for _ in range(number_of_leds)]
+        for shape in shapes:
+            if shape.led >= number_of_leds:
+                continue
+            if shape.text is not None:
+                item = self.create_text(*shape.coords, text=shape.text, fill=self.off_color, font=self.font)
+            else:
+                item = self.create_polygon(shape.coords, fill=self.off_color)
+            self.items[shape.led].append(item)
+            if self.on_click is not None:
+                self.tag_bind(item, "<Button-1>", lambda event, key=shape.key, index=shape.index: self.on_click(key, index))
+                self.tag_bind(item, "<Enter>", lambda event: self.config(cursor="hand2"))
+                self.tag_bind(item, "<Leave>", lambda event: self.config(cursor=""))
+        bbox = self.bbox("all")
+        if bbox is not None:
+            self.config(width=bbox[2] + padding, height=bbox[3] + padding)
+        self.shown = None
+
+    def show(self, frame):
+        """Shows an (N, 3) uint8 frame, returns the number of LEDs recolored."""
+        frame = frame[:len(self.items)]
+        if self.shown is None or len(self.shown) != len(frame):
+            changed = np.arange(len(frame))
+        else:
+            changed = np.flatnonzero((frame != self.shown).any(axis=1))
+        if not len(changed):
+            return 0
+        off = ~frame[changed].any(axis=1)
+        colors = rgb_to_hex(frame[changed])
+        for led, color, is_off in zip(changed.tolist(), colors, off.tolist()):
+            fill = self.off_color if is_off else "#" + color
+            for item in self.items[led]:
+                self.itemconfig(item, fill=fill)
+        self.shown = frame.copy()
+        return len(changed)
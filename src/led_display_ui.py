@@ -1,29 +1,19 @@
 import tkinter as tk
-from tkinter import ttk, colorchooser
+from tkinter import ttk, colorchooser, messagebox
+import copy
 import json
 import sys
 from config import leds_indexes, leds_indexes_small, NUMBER_OF_LEDS, display_modes, default_config, display_modes_small
 import numpy as np
-import threading
 import time
-from utils import interpolate_color, get_random_color
-
-segmented_digit_layout = {# Position segments in a 7-segment layout
-    "top_left":
-        {"row":1, "column":0, "padx":2, "pady":0, "orientation": "Vertical"},
-    "top":
-        {"row":0, "column":1, "pady":2, "padx":0,  "orientation": "Horizontal"},
-    "top_right":
-        {"row":1, "column":2, "padx":2, "pady":0, "orientation": "Vertical"},
-    "middle":
-        {"row":2, "column":1, "pady":2, "padx":0, "orientation": "Horizontal"},
-    "bottom_left":
-        {"row":3, "column":0, "padx":2, "pady":0, "orientation": "Vertical"},
-    "bottom":
-        {"row":4, "column":1, "pady":2, "padx":0, "orientation": "Horizontal"},
-    "bottom_right":
-        {"row":3, "column":2, "padx":2, "pady":0, "orientation": "Vertical"},
-}
+from metrics import Metrics
+from renderer import Renderer
+from stats import RollingHistogram
+from led_canvas import LedCanvas, big_layout_geometry, small_layout_geometry
+from frame_publisher import FrameSubscriber, get_socket_path
+from packet_encoder import PacketEncoder
+from control_socket import send_request
+from config_watcher import write_config_file
 
 
 class LEDDisplayUI:
@@ -31,9 +21,17 @@ class LEDDisplayUI:
         self.root = root
         self.config_path = config_path
         self.config = self.load_config()
+        self.saved_config = copy.deepcopy(self.config)  # As of the last write_config()
         self.root.title("LED Display Layout")
         self.style = ttk.Style()
         self.leds_indexes = leds_indexes
+        # The preview renders the same frames as the controller, from the real metrics. While the
+        # controller runs, the UI mirrors the frames it sends instead, and samples nothing itself.
+        self.subscriber = FrameSubscriber(get_socket_path())
+        self.mirror = tk.BooleanVar(value=self.subscriber.connected)
+        self.decoders = {}  # PacketEncoder per (number_of_leds, header) of the mirrored frames
+        self.metrics = None  # Created when the preview is used
+        self.renderer = None  # Set by write_config()
         # Layout mode selection
         self.layout_mode = tk.StringVar(value=self.config.get("layout_mode", "big"))
         layout_mode_frame = ttk.LabelFrame(root, text="Choose layout mode:", padding=(10, 10))
@@ -43,34 +41,49 @@ class LEDDisplayUI:
         layout_dropdown.grid(row=0, column=0, padx=5, pady=5)
         layout_dropdown.bind("<<ComboboxSelected>>", lambda e: self.change_layout_mode())
 
+        # Mirror mode selection
+        mirror_frame = ttk.LabelFrame(root, text="Running controller:", padding=(10, 10))
+        mirror_frame.grid(row=0, column=1, pady=10)
+        mirror_button = ttk.Checkbutton(mirror_frame, text="Mirror its frames", variable=self.mirror, command=self.change_mirror)
+        mirror_button.grid(row=0, column=0, padx=5, pady=5)
+        self.mirror_label = ttk.Label(mirror_frame, text="")
+        self.mirror_label.grid(row=1, column=0, padx=5, pady=5)
+
+        # All the LEDs are drawn on one canvas, switching layouts only replaces its shapes
+        self.led_canvas = LedCanvas(root, on_click=self.change_led_color)
+        self.led_canvas.grid(row=1, column=0, columnspan=3, padx=10, pady=10)
+
         # Frames for layout
         self.layout_frame = ttk.Frame(root)
-        self.layout_frame.grid(row=1, column=0, columnspan=3, padx=10, pady=10)
+        self.layout_frame.grid(row=2, column=0, columnspan=3, padx=10, pady=10)
 
         # Create initial layout (big)
         self.change_layout_mode()
 
-        # Start update thread
-        self.update_interval = self.config["update_interval"]
-        self.cycle_duration = self.config["cycle_duration"]
-        self.start_time = time.time()
-        threading.Thread(target=self.update_ui_loop, daemon=True).start()
-
         # Reset button
         reset_button = ttk.Button(
             root,
             text="Reset default config",
             command=lambda: self.set_default_config(),
         )
-        reset_button.grid(row=2, column=0, padx=10, pady=10, columnspan=2)
+        reset_button.grid(row=3, column=0, padx=10, pady=10, columnspan=2)
+
+        # Time taken by the preview redraws, shown once per second
+        self.redraw_times = RollingHistogram(window=100)
+        self.next_redraw_report = 0.0
+        self.redraw_label = ttk.Label(root, text="Redraw: -")
+        self.redraw_label.grid(row=4, column=0, padx=10, pady=5, columnspan=2)
+
+        # Redraws run on the Tk main thread
+        self.start_time = time.monotonic()
+        self.root.after(0, self.update_ui)
 
     def create_big_layout(self):
         # Clear previous layout
         for widget in self.layout_frame.winfo_children():
             widget.destroy()
 
-        self.number_of_leds = NUMBER_OF_LEDS
-        self.leds_ui = np.array([None] * self.number_of_leds)
+        self.led_canvas.set_geometry(big_layout_geometry(self.leds_indexes), NUMBER_OF_LEDS)
 
         led_frame = ttk.Frame(self.layout_frame, padding=(10, 10))
         led_frame.grid(row=0, column=0, padx=10, pady=10)
@@ -81,20 +94,15 @@ class LEDDisplayUI:
         self.create_color_mode(display_frame)
         self.create_display_mode(display_frame, display_modes)
 
-        # Create frames for CPU and GPU
-        self.cpu_frame = self.create_device_frame(led_frame, "cpu", 1)
-        self.gpu_frame = self.create_device_frame(led_frame, "gpu", 2)
-
         # Add controls for group selection and color change
-        self.create_controls(led_frame)
+        self.create_controls(led_frame, row=1)
 
     def create_small_layout(self):
         # Clear previous layout
         for widget in self.layout_frame.winfo_children():
             widget.destroy()
 
-        self.number_of_leds = 30
-        self.leds_ui = np.array([None] * self.number_of_leds)
+        self.led_canvas.set_geometry(small_layout_geometry(self.leds_indexes), NUMBER_OF_LEDS)
 
         led_frame = ttk.Frame(self.layout_frame, padding=(10, 10))
         led_frame.grid(row=0, column=0, padx=10, pady=10)
@@ -105,31 +113,8 @@ class LEDDisplayUI:
         display_frame.grid(row=0, column=0, padx=10, pady=10)
         self.create_display_mode(display_frame, display_modes_small)
 
-        # Device LED labels in row 1
-        device_led_frame = ttk.Frame(led_frame)
-        device_led_frame.grid(row=1, column=0, columnspan=4, padx=5, pady=5)
-        
-        self.create_label(device_led_frame, "cpu_led", "CP", 0, 0, index=0)
-        self.create_label(device_led_frame, "cpu_led", "U", 0, 1, index=1)
-        self.create_label(device_led_frame, "gpu_led", "GP", 1, 0, index=0)
-        self.create_label(device_led_frame, "gpu_led", "U", 1, 1, index=1)
-
-        # Temperature unit selection in row 1, column 1
-        unit_frame = ttk.Frame(led_frame)
-        unit_frame.grid(row=1, column=1, padx=5, pady=5)
-        
-        # Create clickable labels for °C and °F
-        self.create_label(unit_frame, "celsius", "°C", 0, 0)
-        self.create_label(unit_frame, "fahrenheit", "°F", 1, 0)
-        self.create_label(unit_frame, "percent_led", "%", 2, 0)
-        
-        # Digit frame in row 2
-        digit_frame = ttk.Frame(led_frame)
-        digit_frame.grid(row=2, column=0, columnspan=2, padx=5, pady=5)
-        self.create_segmented_digit_layout(digit_frame, "digit_frame")
-        
-        # Add controls for group selection and color change in row 3
-        self.create_controls(led_frame, row=3)
+        # Add controls for group selection and color change
+        self.create_controls(led_frame, row=1)
 
 
     def change_layout_mode(self):
@@ -156,88 +141,72 @@ class LEDDisplayUI:
         self.config_frame = self.create_config_panel(self.layout_frame)
         print("Default config set.")
 
-    def update_ui_loop(self):
-        while True:
-            try:
-                current_time = time.time()
-                elapsed_time = (current_time - self.start_time)%(self.cycle_duration*2)
-                colors = np.array(self.config[self.get_color_key()]["colors"])
-                for index, color_str in enumerate(colors):
-                    color = color_str
-                    if color.lower() == "random":
-                        color = get_random_color()
-                    elif color.startswith("wave_"):
-                        wave_type, gradient = color.split(";", 1)
-                        colors_list = gradient.split('-')
-                        num_colors = len(colors_list)
-
-                        if num_colors >= 2:
-                            if colors_list[0] != colors_list[-1]:
-                                colors_list.append(colors_list[0])
-                            
-                            num_segments = len(colors_list) - 1
-                            total_duration = self.cycle_duration
-                            
-                            if wave_type == "wave_ltr":
-                                phase_shift = (index / self.number_of_leds) * total_duration
-                            else: # wave_rtl
-                                phase_shift = ((self.number_of_leds - index) / self.number_of_leds) * total_duration
-                            
-                            time_in_cycle = ((current_time - self.start_time) + phase_shift) % total_duration
-                            
-                            if num_segments > 0:
-                                segment_duration = total_duration / num_segments
-                                segment_index = min(int(time_in_cycle / segment_duration), num_segments - 1)
-                                
-                                start_color = colors_list[segment_index]
-                                end_color = colors_list[segment_index + 1]
-                                
-                                time_in_segment = time_in_cycle - (segment_index * segment_duration)
-                                if segment_duration > 0:
-                                    factor = time_in_segment / segment_duration
-                                else:
-                                    factor = 0
-                                color = interpolate_color(start_color=start_color, end_color=end_color, factor=factor)
-                            else:
-                                color = colors_list[0]
-                        else:
-                            color = colors_list[0]
-                    elif "-" in color:
-                        split_color = color.split("-")
-                        if len(split_color) == 3:
-                            start_color, end_color, metric = split_color
-                            factor=elapsed_time/(self.cycle_duration*2)
-                            color = interpolate_color(start_color=start_color, end_color=end_color, factor=factor)
-                        else:
-                            colors_list = split_color
-                            num_colors = len(colors_list)
-                            
-                            if num_colors >= 2:
-                                # Add first color to the end to make a loop
-                                if colors_list[0] != colors_list[-1]:
-                                    colors_list.append(colors_list[0])
-                                
-                                num_segments = len(colors_list) - 1
-                                total_duration = self.cycle_duration
-                                time_in_cycle = (current_time - self.start_time) % total_duration
-                                
-                                segment_duration = total_duration / num_segments
-                                segment_index = min(int(time_in_cycle / segment_duration), num_segments - 1)
-                                
-                                start_color = colors_list[segment_index]
-                                end_color = colors_list[segment_index + 1]
-                                
-                                time_in_segment = time_in_cycle - (segment_index * segment_duration)
-                                factor = time_in_segment / segment_duration
-                                
-                                color = interpolate_color(start_color=start_color, end_color=end_color, factor=factor)
-                            else:
-                                color = colors_list[0]
-
-                    self.set_ui_color(index, color="#"+color)
-            except Exception as e:
-                print(f"Error in update_ui_loop: {e}")
-            time.sleep(self.update_interval)
+    def update_renderer(self):
+        """Rebuilds the preview after a config change, the color plans that did not change are reused."""
+        self.update_interval = self.config.get("update_interval", 0.1)
+        try:
+            self.renderer = Renderer(self.config, previous=self.renderer)
+            if self.metrics is not None:
+                self.metrics.set_required(self.renderer.required_metrics())
+        except Exception as e:
+            print(f"Error compiling config: {e}")
+
+    def change_mirror(self):
+        if self.mirror.get():
+            if self.metrics is not None:
+                self.metrics.stop()
+        else:
+            self.subscriber.close()
+            self.mirror_label.config(text="")
+            self.led_canvas.shown = None
+
+    def preview_metrics(self):
+        """The metrics of the preview, sampled by the UI itself."""
+        if self.metrics is None:
+            self.metrics = Metrics()
+            self.metrics.set_required(self.renderer.required_metrics())
+        self.metrics.start()
+        return self.metrics.get_metrics(self.renderer.temp_unit)
+
+    def show_mirrored_frame(self):
+        """Shows the last frame the controller sent to the device, if there is a new one."""
+        message = self.subscriber.poll()
+        if message is None:
+            if not self.subscriber.connected:
+                self.mirror_label.config(text="Controller not running")
+            return
+        info, buffer = message
+        key = (info["number_of_leds"], info["header"])
+        decoder = self.decoders.get(key)
+        if decoder is None:
+            decoder = self.decoders[key] = PacketEncoder(info["number_of_leds"], bytes.fromhex(info["header"]))
+        self.led_canvas.show(decoder.decode(buffer))
+        metrics = info["metrics"]
+        self.mirror_label.config(text=" ".join(f"{device.upper()} {metrics.get(device + '_temp', '-')}° {metrics.get(device + '_usage', '-')}%"
+                                               for device in ["cpu", "gpu"]))
+
+    def update_ui(self):
+        """
+        Redraws the preview on the Tk main thread and schedules the next redraw. Only the
+        LEDs whose color changed since the last redraw are recolored.
+        """
+        start = time.perf_counter()
+        try:
+            if self.mirror.get():
+                self.show_mirrored_frame()
+            else:
+                metrics = self.preview_metrics()
+                self.led_canvas.show(self.renderer.frame(metrics, time.monotonic() - self.start_time))
+        except Exception as e:
+            print(f"Error in update_ui: {e}")
+        elapsed = time.perf_counter() - start
+        self.redraw_times.add(elapsed)
+        now = time.monotonic()
+        if now >= self.next_redraw_report:
+            summary = self.redraw_times.summary()
+            self.redraw_label.config(text=f"Redraw: p50 {summary['p50_ms']:.2f} ms, max {summary['max_ms']:.2f} ms")
+            self.next_redraw_report = now + 1.0
+        self.root.after(max(int((self.update_interval - elapsed) * 1000), 1), self.update_ui)
 
     def load_config(self):
         try:
@@ -269,141 +238,74 @@ class LEDDisplayUI:
             print("Config not loaded. Cannot set color.")
 
     def write_config(self):
-        try:
-            with open(self.config_path, 'w') as f:
-                json.dump(self.config, f, indent=4)
-        except Exception as e:
-            print(f"Error writing config: {e}")
-
-    def set_ui_color(self, index, color):
-        if self.leds_ui[index] is not None:
-            if isinstance(self.leds_ui[index],(ttk.Label)):
-                self.leds_ui[index].config(foreground=color)
+        """Sends the changes to the controller when it is running, it applies and saves them, else writes the config file."""
+        if self.send_config_changes() is None:
+            try:
+                write_config_file(self.config_path, self.config)
+            except Exception as e:
+                print(f"Error writing config: {e}")
+        self.saved_config = copy.deepcopy(self.config)
+        self.update_renderer()
+
+    def send_config_changes(self):
+        """
+        Sends what changed since the last write_config() to the running controller: the LEDs
+        whose color changed, and the other top-level keys that changed. Returns True if it
+        applied them, False if it refused one (the controls then show the controller's config
+        again), None if it is not running or the changes cannot be sent as a patch (removed keys).
+        """
+        if set(self.saved_config) - set(self.config):
+            return None
+        requests = []
+        values = {}
+        for key, value in self.config.items():
+            previous = self.saved_config.get(key)
+            if value == previous:
+                continue
+            if (key in ("metrics", "time") and isinstance(value, dict) and isinstance(previous, dict)
+                    and dict(value, colors=None) == dict(previous, colors=None)
+                    and len(value.get("colors", [])) == len(previous.get("colors", []))):
+                leds_by_color = {}
+                for led, (color, previous_color) in enumerate(zip(value["colors"], previous["colors"])):
+                    if color != previous_color:
+                        leds_by_color.setdefault(color, []).append(led)
+                requests += [{"op": "set_colors", "key": key, "leds": leds, "color": color} for color, leds in leds_by_color.items()]
             else:
-                self.leds_ui[index].config(background=color)
-
-    def create_device_frame(self, root, device_name, row):
-        frame = ttk.LabelFrame(root, text=device_name.upper(), padding=(10, 10))
-        frame.grid(row=row, column=0, padx=10, pady=10)
-
-        device_led_frame = ttk.Frame(frame)
-        device_led_frame.grid(row=0, column=0, padx=0, pady=0)
-        self.create_label(device_led_frame, device_name+"_led", device_name.upper()[0], 0, 0, index=int(device_name=="cpu"))
-        self.create_label(device_led_frame, device_name+"_led", device_name.upper()[1:], 0, 1, index=int(device_name!="cpu"))
-
-        temp_frame = ttk.LabelFrame(frame, text=device_name.upper()+" temp", padding=(10, 10))
-        temp_frame.grid(row=1, column=0, padx=10, pady=10)
-
-        # Add temperature unit selection
-        unit_frame = ttk.Frame(frame)
-        unit_frame.grid(row=1, column=1, padx=5, pady=5)
-        
-        # Create clickable labels for °C and °F
-        self.create_label(unit_frame, device_name+"_celsius", "°C", 0, 0)
-        self.create_label(unit_frame, device_name+"_fahrenheit", "°F", 1, 0)
-
-        usage_frame = ttk.LabelFrame(frame, text=device_name.upper()+" usage", padding=(10, 10))
-        usage_frame.grid(row=1, column=2, padx=10, pady=10)
-
-        # Create LED layout for CPU and GPU
-        self.create_segmented_digit_layout(temp_frame, device_name+"_temp")
-        self.create_usage_frame(usage_frame, device_name+"_usage")
-        
-        self.create_label(frame, device_name+"_percent_led", "%", 1, 3)
-        return frame
-
-    def create_label(self, parent_frame, led_key, text, row, column, index=None):
-        unit_style = {"font": ("Arial", 20), "cursor": "hand2"}
-        label = ttk.Label(parent_frame, text=text, **unit_style)
-        label.grid(row=row, column=column, padx=0, pady=5)
-        label.bind(
-            "<Button-1>",
-            lambda event,
-            led_key=led_key, led_index=index: self.change_led_color(
-                led_key, index=led_index
-            ),
-        )
-        if index is not None:
-            if led_key in self.leds_indexes and isinstance(self.leds_indexes[led_key], list):
-                if index < len(self.leds_indexes[led_key]):
-                    self.leds_ui[self.leds_indexes[led_key][index]] = label
-            elif led_key in self.leds_indexes:
-                self.leds_ui[self.leds_indexes[led_key]] = label
-        else:
-            if led_key in self.leds_indexes:
-                self.leds_ui[self.leds_indexes[led_key]] = label
-
-    def create_usage_frame(self, frame, label):
-        index = 0
-        one_frame = ttk.Frame(frame, padding=(5, 5))
-        one_frame.grid(row=1, column=0, padx=5, pady=5)
-        for one_index in range(2,0,-1):
-            self.create_segment(
-                one_frame,
-                label,
-                led_index=index,
-                row=one_index,
-                column=0,
-                pady=4,
-            )
-            index+=1
-        
-        digit_frame = ttk.Frame(frame, padding=(5, 5))
-        digit_frame.grid(row=1, column=1, padx=0, pady=0)
-        self.create_segmented_digit_layout(digit_frame, label, number_of_digits=2, index=index)
-
-    def create_segment(self, parent_frame, label, led_index, row, column, orientation="Vertical", pady=0, padx=0):
-        if orientation == "Vertical":
-            segment = tk.Canvas(
-                parent_frame,
-                width=5,
-                height=20,
-                highlightthickness=0,
-            )
+                values[key] = value
+        if values:
+            requests.insert(0, {"op": "set", "values": values})
+        for request in requests:
+            try:
+                response = send_request(request, config_path=self.config_path)
+            except (OSError, ValueError) as e:
+                print(f"Error sending config changes to the controller: {e}")
+                return None
+            if response is None:
+                return None
+            if not response.get("ok"):
+                print(f"Error: the controller refused the config change: {response.get('error')}")
+                messagebox.showerror("Config change refused", response.get("error"), parent=self.root)
+                self.reload_controller_config()
+                return False
+        return True
+
+    def reload_controller_config(self):
+        """Replaces the config with the one the controller runs and rebuilds the controls from it."""
+        try:
+            response = send_request({"op": "get"}, config_path=self.config_path)
+        except (OSError, ValueError) as e:
+            print(f"Error reading the controller config: {e}")
+            return
+        if response is None or not response.get("ok"):
+            return
+        self.config = response["config"]
+        self.layout_mode.set(self.config.get("layout_mode", "big"))
+        if self.layout_mode.get() == "big":
+            self.leds_indexes = leds_indexes
+            self.create_big_layout()
         else:
-            segment = tk.Canvas(
-                parent_frame,
-                width=20,
-                height=5,
-                highlightthickness=0,
-            )
-        segment.grid(
-            row=row,
-            column=column,
-            padx=padx,
-            pady=pady,
-        )
-        segment.bind(
-            "<Button-1>",
-            lambda event,
-            led_key=label, led_index=led_index: self.change_led_color(
-                led_key, index=led_index
-            ),
-        )
-        if led_index is not None and label in self.leds_indexes:
-            if isinstance(self.leds_indexes[label], list) and led_index < len(self.leds_indexes[label]):
-                self.leds_ui[self.leds_indexes[label][led_index]] = segment
-            elif isinstance(self.leds_indexes[label], int):
-                self.leds_ui[self.leds_indexes[label]] = segment
-
-    def create_segmented_digit_layout(self, frame, label, number_of_digits=3, index = 0):
-        for digit_index in range(number_of_digits):
-            digit_frame = ttk.Frame(frame, padding=(5, 5))
-            digit_frame.grid(row=1, column=digit_index, padx=5, pady=5)
-
-            # Create 7 segments for the digit
-            for segment_name in segmented_digit_layout.keys():
-                self.create_segment(
-                    digit_frame,
-                    label,
-                    led_index=index,
-                    row=segmented_digit_layout[segment_name]["row"],
-                    column=segmented_digit_layout[segment_name]["column"],
-                    orientation=segmented_digit_layout[segment_name]["orientation"],
-                    pady=segmented_digit_layout[segment_name]["pady"],
-                    padx=segmented_digit_layout[segment_name]["padx"],
-                )
-                index+=1
+            self.leds_indexes = leds_indexes_small
+            self.create_small_layout()
 
     def create_display_mode(self, root, display_modes, row=0, column=0):
         display_mode_frame = ttk.LabelFrame(root, text="Choose display mode :", padding=(10, 10))
@@ -668,3 +570,6 @@ if __name__ == "__main__":
         app = LEDDisplayUI(root)
 
     root.mainloop()
+    app.subscriber.close()
+    if app.metrics is not None:
+        app.metrics.close()
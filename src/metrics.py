@@ -4,16 +4,23 @@ import psutil
 import time
 import os
 import json
-
-try:
-    import pyamdgpuinfo
-except Exception as e:
-    print("pyamdgpuinfo cannot start : ",str(e))
+import threading
+from types import MappingProxyType
+import probe_cache
+from nvml_backend import NvmlBackend
+from nvidia_smi_backend import NvidiaSmiStream
+from hwmon_backend import HwmonBackend
+from stats import stage_stats
 
 
 
 class Metrics:
-    def __init__(self, update_interval=0.5):
+    """
+    Samples the CPU/GPU metrics with the first working backend of each. candidates
+    ({metric: [(name, function), ...]}) replaces the system backends, e.g. with stubs
+    for benchmarks, and is probed without the probe cache.
+    """
+    def __init__(self, update_interval=0.5, probe_timeout=3.0, candidates=None):
         self.metrics_functions = {
             'cpu_temp': None,
             'gpu_temp': None,
@@ -31,74 +38,267 @@ class Metrics:
             with open(config_path, 'r') as f:
                 config = json.load(f)
                 self.gpu_vendor = config.get('gpu_vendor', 'nvidia')
+                metrics_update_interval = config.get('metrics_update_interval', update_interval)
+                amd_gpu_temp_sensor = config.get('amd_gpu_temp_sensor', 'edge')
         except Exception as e:
             print(f"Could not load config to get gpu_vendor, defaulting to nvidia: {e}")
             self.gpu_vendor = 'nvidia'
+            metrics_update_interval = update_interval
+            amd_gpu_temp_sensor = 'edge'
 
-        try:
-            device_count = pyamdgpuinfo.detect_gpus()
-            if device_count > 0:
-                self.gpu = pyamdgpuinfo.get_gpu(0)
-            else:
-                print(f"No AMD GPU detected.")
-                self.gpu = -1
-        except:
-            print("pyamdgpuinfo not installed. GPU temperature will not be available.")
-            self.gpu = None
-
-        candidates =  {
-            'cpu_temp': [get_cpu_temp_psutils,get_cpu_temp_linux,get_cpu_temp_windows_wmi,get_cpu_temp_windows_wintmp,get_cpu_temp_raspberry_pi],
+        # pyamdgpuinfo is only imported and initialized if an AMD backend gets probed
+        self.gpu = None
+        self._amd_gpu_detected = False
+        self._amd_gpu_lock = threading.Lock()  # The gpu_temp and gpu_usage probes run in parallel
+
+        self.hwmon = HwmonBackend(amd_gpu_temp_sensor=amd_gpu_temp_sensor)
+        # Candidate backends per metric, by name, in order of preference
+        system_candidates =  {
+            'cpu_temp': [("hwmon", self.hwmon.get_cpu_temp), ("psutil", get_cpu_temp_psutils), ("wmi", get_cpu_temp_windows_wmi),
+                         ("wintmp", get_cpu_temp_windows_wintmp), ("vcgencmd", get_cpu_temp_raspberry_pi)],
             'gpu_temp': [],
-            'cpu_usage': [get_cpu_usage],
+            'cpu_usage': [("psutil", get_cpu_usage)],
             'gpu_usage': []
         }
 
+        self.nvml = None
+        self.nvidia_smi = None
         if self.gpu_vendor == 'nvidia':
-            candidates['gpu_temp'] = [get_gpu_temp_nvidia, get_gpu_temp_wintemp]
-            candidates['gpu_usage'] = [get_gpu_usage_nvml, get_gpu_usage_nvidia_smi]
+            self.nvml = NvmlBackend()
+            # Only started if NVML is not available
+            self.nvidia_smi = NvidiaSmiStream(interval_ms=int(metrics_update_interval * 1000))
+            system_candidates['gpu_temp'] = [("nvml", self.nvml.get_temp), ("nvidia_smi", self.nvidia_smi.get_temp), ("wintmp", get_gpu_temp_wintemp)]
+            system_candidates['gpu_usage'] = [("nvml", self.nvml.get_usage), ("nvidia_smi", self.nvidia_smi.get_usage)]
         elif self.gpu_vendor == 'amd':
-            candidates['gpu_temp'] = [self.get_gpu_temp_amdgpuinfo]
-            candidates['gpu_usage'] = [self.get_gpu_usage_amd]
+            system_candidates['gpu_temp'] = [("hwmon", self.hwmon.get_gpu_temp), ("pyamdgpuinfo", self.get_gpu_temp_amdgpuinfo)]
+            system_candidates['gpu_usage'] = [("hwmon", self.hwmon.get_gpu_usage), ("pyamdgpuinfo", self.get_gpu_usage_amd)]
+        self.backend_names = {}
+        if candidates is None:
+            self._select_backends(system_candidates, probe_timeout)
+        else:
+            self._select_backends(candidates, probe_timeout, use_cache=False)
+        for metric in self.metrics_functions:
+            if self.metrics_functions[metric] is None:
+                print(f"Warning: No suitable function found for {metric}.")
+        self._stop_unused_backends()
+        self.last_update = time.time()
+        self.update_interval = update_interval # seconds
+        # Per-metric sampling intervals, metrics not listed use update_interval
+        self.metric_intervals = {}
+        # Latest values, replaced as a whole by each refresh so readers never see a partial update
+        self.snapshot = MappingProxyType(dict(self.metrics))
+        self.published = threading.Event()  # Set on each new snapshot, lets the display sleep until then
+        self._publish_lock = threading.Lock()
+        # Metrics the display currently depends on, the others are not sampled
+        self.required_metrics = set(self.metrics)
+        self._gpu_paused = False
+        self._last_sample = {metric: time.monotonic() for metric in self.metrics}
+        self._sampler = None
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()  # Set to make the sampler look at its schedule again
+
+    def _select_backends(self, candidates, probe_timeout, use_cache=True):
+        """
+        Reuses the backends found by the previous run on this machine, validated with one read.
+        Metrics without a valid cached backend are probed in parallel, each one with its candidates
+        in order of preference, so that a fallback (e.g. the nvidia-smi process) is only started
+        when the backends before it fail. Only the backends found are cached: a metric without
+        one, e.g. because probing timed out at boot, is probed again on the next start.
+        """
+        fingerprint = probe_cache.get_fingerprint(self.gpu_vendor) if use_cache else None
+        cached = probe_cache.load(fingerprint) if use_cache else {}
+        missing = []
         for metric, functions in candidates.items():
-            for function in functions:
+            function = dict(functions).get(cached.get(metric))
+            if function is not None and self._try_backend(metric, cached[metric], function):
+                continue
+            if functions:
+                missing.append(metric)
+        if not missing:
+            return
+
+        probing = {}  # Candidate being probed per metric, for the timeout warning
+        found = {}
+        # Set at the deadline, the probes that are still running do not try their next candidates
+        cancelled = threading.Event()
+        threads = {}
+        for metric in missing:
+            # Daemon threads, so that a hung probe does not keep the interpreter from exiting
+            threads[metric] = threading.Thread(target=self._probe, args=(metric, candidates[metric], probing, found, cancelled),
+                                               name=f"metrics-probe-{metric}", daemon=True)
+            threads[metric].start()
+        deadline = time.monotonic() + probe_timeout
+        for metric in missing:
+            threads[metric].join(max(deadline - time.monotonic(), 0))
+            if threads[metric].is_alive():
+                print(f"Warning: probing {probing.get(metric)} for {metric} timed out.")
+            elif found.get(metric) is not None:
+                self._use_backend(metric, *found[metric])
+        cancelled.set()
+        if use_cache:
+            probe_cache.save(fingerprint, {metric: self.backend_names[metric] for metric in candidates if metric in self.backend_names})
+
+    def _probe(self, metric, candidates, probing, found, cancelled):
+        found[metric] = _probe_candidates(candidates, probing, metric, cancelled)
+        if cancelled.is_set():
+            # Timed out: a backend this probe started (e.g. the nvidia-smi process) is not used
+            self._stop_unused_backends()
+
+    def _stop_unused_backends(self):
+        if self.nvml is not None and not self.uses_backend(self.nvml):
+            self.nvml.shutdown()
+        if self.nvidia_smi is not None and not self.uses_backend(self.nvidia_smi):
+            self.nvidia_smi.stop()
+
+    def _try_backend(self, metric, name, function):
+        try:
+            result = function()
+        except Exception:
+            return False
+        if result is None:
+            return False
+        self._use_backend(metric, name, function, result)
+        return True
+
+    def _use_backend(self, metric, name, function, result):
+        self.metrics[metric] = int(result)
+        self.metrics_functions[metric] = function
+        self.backend_names[metric] = name
+
+    def uses_backend(self, backend):
+        return any(getattr(function, '__self__', None) is backend for function in self.metrics_functions.values())
+
+    def get_interval(self, metric):
+        return self.metric_intervals.get(metric, self.update_interval)
+
+    def refresh(self, metrics=None):
+        """Samples the given metrics (the required ones by default) and publishes a new snapshot."""
+        samples = {}
+        for metric in (metrics if metrics is not None else self.required()):
+            function = self.metrics_functions[metric]
+            if function is not None:
+                start = time.perf_counter()
                 try:
                     result = function()
-                    if result is not None:
-                        self.metrics[metric] = int(result)
-                        self.metrics_functions[metric] = function
-                        break
+                    if result is None:
+                        samples[metric] = 0
+                    else:
+                        samples[metric] = int(result)
                 except Exception as e:
-                    continue
-            if self.metrics_functions[metric] is None:
-                print(f"Warning: No suitable function found for {metric}.")
+                    print(f"Error getting {metric}: {e}")
+                stage_stats.record(f"sample.{metric}.{self.backend_names.get(metric)}", time.perf_counter() - start)
+            self._last_sample[metric] = time.monotonic()
+        # Metrics not sampled keep their last value
+        with self._publish_lock:
+            values = dict(self.snapshot)
+            values.update(samples)
+            self.metrics = values
+            self.snapshot = MappingProxyType(values)
         self.last_update = time.time()
-        self.update_interval = update_interval # seconds
+        self.published.set()
 
-    def get_metrics(self, temp_unit):
-        if time.time() - self.last_update < self.update_interval:
-            metrics = self.metrics.copy()
+    def required(self):
+        return [metric for metric in self.metrics_functions if metric in self.required_metrics]
+
+    def set_required(self, metrics):
+        """
+        Only samples the given metrics from now on. Metrics that were not sampled are
+        due right away so the display does not show a stale value for long.
+        """
+        metrics = set(metrics)
+        if metrics == self.required_metrics:
+            return
+        added = metrics - self.required_metrics
+        self.required_metrics = metrics
+        for metric in added:
+            self._last_sample[metric] = float('-inf')
+        if self._sampler is None:
+            self._pause_unused_backends()
+            if added:
+                self.refresh([metric for metric in self.metrics_functions if metric in added])
         else:
-            for metric, function in self.metrics_functions.items():
-                if function is not None:
-                    try:
-                        result = function()
-                        if result is None:
-                            self.metrics[metric] = 0
-                        else:
-                            self.metrics[metric] = int(result)
-                    except Exception as e:
-                        print(f"Error getting {metric}: {e}")
-            self.last_update = time.time()
-            metrics = self.metrics.copy()
+            self._wakeup.set()
+
+    def _pause_unused_backends(self):
+        """Shuts the GPU backends down while no GPU metric is displayed, so that an idle dGPU can stay asleep."""
+        gpu_required = bool(self.required_metrics & {'gpu_temp', 'gpu_usage'})
+        if not gpu_required and not self._gpu_paused:
+            if self.nvml is not None:
+                self.nvml.shutdown()
+            if self.nvidia_smi is not None:
+                self.nvidia_smi.stop()
+        # Both are restarted by their next query
+        self._gpu_paused = not gpu_required
+
+    def start(self):
+        """Samples each metric on its own schedule from a background thread."""
+        if self._sampler is None:
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._run, name="metrics-sampler", daemon=True)
+            self._sampler.start()
+
+    def stop(self):
+        if self._sampler is not None:
+            self._stop.set()
+            self._wakeup.set()
+            self._sampler.join(timeout=2)
+            self._sampler = None
+
+    def close(self):
+        self.stop()
+        if self.nvml is not None:
+            self.nvml.shutdown()
+        if self.nvidia_smi is not None:
+            self.nvidia_smi.stop()
+        self.hwmon.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.clear()
+            self._pause_unused_backends()
+            now = time.monotonic()
+            required = [metric for metric in self.required() if self.metrics_functions[metric] is not None]
+            due = [metric for metric in required if now - self._last_sample[metric] >= self.get_interval(metric)]
+            if due:
+                self.refresh(due)
+            if not required:
+                # Nothing to sample until set_required() wakes the sampler up
+                self._wakeup.wait()
+                continue
+            next_due = min(self._last_sample[metric] + self.get_interval(metric) for metric in required)
+            self._wakeup.wait(min(max(next_due - time.monotonic(), 0.01), 1))
+
+    def get_metrics(self, temp_unit):
+        if self._sampler is None and time.time() - self.last_update >= self.update_interval:
+            self._pause_unused_backends()
+            self.refresh()
+        metrics = dict(self.snapshot)
 
         for device in ["cpu", "gpu"]:
             if temp_unit[device] == "fahrenheit":
                 metrics[f"{device}_temp"] = int(metrics[f"{device}_temp"] * 9 / 5 + 32)
         return metrics
 
+    def get_amd_gpu(self):
+        with self._amd_gpu_lock:
+            if not self._amd_gpu_detected:
+                self._amd_gpu_detected = True
+                try:
+                    import pyamdgpuinfo
+                    device_count = pyamdgpuinfo.detect_gpus()
+                    if device_count > 0:
+                        self.gpu = pyamdgpuinfo.get_gpu(0)
+                    else:
+                        print(f"No AMD GPU detected.")
+                        self.gpu = -1
+                except Exception as e:
+                    print(f"pyamdgpuinfo cannot start: {e}. GPU temperature will not be available.")
+                    self.gpu = None
+            return self.gpu
+
     def get_gpu_usage_amd(self):
         try:
-            if self.gpu is None:
+            if self.get_amd_gpu() is None:
                 return None
             else:
                 return int(self.gpu.query_load()*100)
@@ -107,11 +307,25 @@ class Metrics:
         
     def get_gpu_temp_amdgpuinfo(self):
         try:
-            return self.gpu.query_temperature()
+            return self.get_amd_gpu().query_temperature()
         except Exception as e:
             print(f"Error getting AMD GPU temperature: {e}")
             return None
 
+def _probe_candidates(candidates, probing, metric, cancelled):
+    """(name, function, result) of the first of candidates that returns a value, or None once cancelled is set."""
+    for name, function in candidates:
+        if cancelled.is_set():
+            return None
+        probing[metric] = name
+        try:
+            result = function()
+        except Exception:
+            continue
+        if result is not None:
+            return name, function, result
+    return None
+
 def get_cpu_temp_psutils():
     try:
         if hasattr(psutil, 'sensors_temperatures'):
@@ -123,12 +337,6 @@ def get_cpu_temp_psutils():
                         return temps[key][0].current
     except Exception:
         return None
-def get_cpu_temp_linux():
-    try:
-        with open('/sys/class/thermal/thermal_zone0/temp', 'r') as f:
-            return float(f.read().strip()) / 1000.0
-    except Exception:
-        return None
 def get_cpu_temp_windows_wmi(): 
     try:
         import wmi
@@ -147,36 +355,11 @@ def get_cpu_temp_windows_wintmp():
     
 def get_cpu_temp_raspberry_pi():
     try:
-        output = subprocess.check_output(['vcgencmd', 'measure_temp']).decode()
+        output = subprocess.check_output(['vcgencmd', 'measure_temp'], timeout=2).decode()
         return float(re.search(r'temp=(\d+\.\d+)', output).group(1))
     except Exception:
         return None
 
-def get_gpu_temp_nvidia():
-    # Try NVIDIA GPU first
-    try:
-        # Try using pynvml library
-        try:
-            from pynvml import nvmlInit, nvmlDeviceGetCount, nvmlDeviceGetHandleByIndex, \
-                            nvmlDeviceGetTemperature, NVML_TEMPERATURE_GPU, nvmlShutdown
-            
-            nvmlInit()
-            device_count = nvmlDeviceGetCount()
-            
-            if device_count > 0:
-                handle = nvmlDeviceGetHandleByIndex(0)
-                temp = nvmlDeviceGetTemperature(handle, NVML_TEMPERATURE_GPU)
-                nvmlShutdown()
-                return temp
-            
-            nvmlShutdown()
-        except:
-            # Try using nvidia-smi command
-            output = subprocess.check_output(['nvidia-smi', '--query-gpu=temperature.gpu', '--format=csv,noheader']).decode()
-            return float(output.strip().split('\n')[0])
-    except:
-        return None
-
 def get_gpu_temp_wintemp():
     try:
         import WinTmp
@@ -191,29 +374,3 @@ def get_cpu_usage():
     except:
         print("Warning: Could not retrieve CPU usage.")
         return None
-
-def get_gpu_usage_nvidia_smi():
-    try: 
-        output = subprocess.check_output(
-            ['nvidia-smi', '--query-gpu=utilization.gpu',
-                '--format=csv,noheader']
-        ).decode().strip()
-        return int(output.split()[0])
-    except Exception:
-        return None
-    
-def get_gpu_usage_nvml():
-    try:
-        # NVIDIA GPUs using pynvml
-        from pynvml import (nvmlInit, nvmlShutdown,
-                        nvmlDeviceGetHandleByIndex,
-                        nvmlDeviceGetUtilizationRates)
-        nvmlInit()
-        try:
-            handle = nvmlDeviceGetHandleByIndex(0)
-            utilization = nvmlDeviceGetUtilizationRates(handle)
-            return int(utilization.gpu)
-        finally:
-            nvmlShutdown()
-    except:
-        return None
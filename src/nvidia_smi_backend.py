@@ -0,0 +1,110 @@
+import subprocess
+import threading
+import time
+
+
+class NvidiaSmiStream:
+    """
+    NVIDIA GPU temperature and usage from one long-running `nvidia-smi -lms` process
+    instead of one fork per sample. A reader thread parses the CSV lines as they
+    arrive and restarts the process if it dies. The command can be replaced,
+    e.g. by a script printing "temperature, utilization" lines for testing.
+    """
+    def __init__(self, interval_ms=1000, device_index=0, command=None, restart_delay=5.0, first_sample_timeout=3.0):
+        self.interval_ms = interval_ms
+        if command is None:
+            command = ['nvidia-smi', '-i', str(device_index),
+                       '--query-gpu=temperature.gpu,utilization.gpu', '--format=csv,noheader',
+                       '-lms', str(interval_ms)]
+        self.command = command
+        self.restart_delay = restart_delay
+        self.first_sample_timeout = first_sample_timeout
+        self.temp = None
+        self.usage = None
+        self.last_sample_time = None
+        self.restarts = 0
+        self.unavailable = False  # nvidia-smi could not be started at all
+        self._process = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._first_sample = threading.Event()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None and not self.unavailable:
+                self._stop.clear()
+                # After a stop(), the next read waits for a sample of the new process, not the old one
+                self._first_sample.clear()
+                self.last_sample_time = None
+                self._thread = threading.Thread(target=self._run, name="nvidia-smi-reader", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._stop.set()
+            process = self._process
+        if process is not None:
+            try:
+                process.terminate()
+            except Exception:
+                pass
+        if thread is not None:
+            thread.join(timeout=2)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                process = subprocess.Popen(self.command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                           text=True, bufsize=1)
+            except OSError as e:
+                print(f"Could not start nvidia-smi: {e}")
+                self.unavailable = True
+                self._first_sample.set()
+                return
+            with self._lock:
+                self._process = process
+            for line in process.stdout:
+                self.parse_line(line)
+                if self._stop.is_set():
+                    break
+            process.stdout.close()
+            returncode = process.wait()
+            with self._lock:
+                self._process = None
+            if self._stop.is_set():
+                return
+            self.restarts += 1
+            print(f"nvidia-smi exited with code {returncode}, restarting in {self.restart_delay}s.")
+            self._stop.wait(self.restart_delay)
+
+    def parse_line(self, line):
+        parts = [part.strip().rstrip('%').strip() for part in line.split(',')]
+        if len(parts) < 2:
+            return
+        try:
+            temp, usage = float(parts[0]), int(float(parts[1]))
+        except ValueError:  # "[N/A]", "[Not Supported]"...
+            return
+        self.temp, self.usage = temp, usage
+        self.last_sample_time = time.monotonic()
+        self._first_sample.set()
+
+    def _latest(self, value):
+        if self._thread is None:
+            self.start()
+            # The first line takes a moment to arrive, wait for it so that probing sees a value
+            self._first_sample.wait(self.first_sample_timeout)
+        if self.last_sample_time is None:
+            return None
+        # Values older than a few intervals mean the process is stuck or being restarted
+        if time.monotonic() - self.last_sample_time > max(3 * self.interval_ms / 1000, 3):
+            return None
+        return value()
+
+    def get_temp(self):
+        return self._latest(lambda: self.temp)
+
+    def get_usage(self):
+        return self._latest(lambda: self.usage)
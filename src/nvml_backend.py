@@ -0,0 +1,71 @@
+import atexit
+import threading
+
+
+class NvmlBackend:
+    """
+    NVIDIA GPU temperature and usage through one long-lived NVML session.
+    NVML is initialized on first use, device handles are cached per index,
+    and the session is dropped and re-initialized after an error.
+    pynvml can be injected for testing, it is imported lazily otherwise.
+    """
+    def __init__(self, device_index=0, pynvml=None):
+        self.device_index = device_index
+        self._pynvml = pynvml
+        self._initialized = False
+        self._atexit_registered = False
+        self._handles = {}
+        self._lock = threading.Lock()
+
+    def _module(self):
+        if self._pynvml is None:
+            import pynvml
+            self._pynvml = pynvml
+        return self._pynvml
+
+    def _handle(self, index):
+        nvml = self._module()
+        if not self._initialized:
+            nvml.nvmlInit()
+            self._initialized = True
+            self._handles = {}
+            if not self._atexit_registered:
+                atexit.register(self.shutdown)
+                self._atexit_registered = True
+        handle = self._handles.get(index)
+        if handle is None:
+            handle = nvml.nvmlDeviceGetHandleByIndex(index)
+            self._handles[index] = handle
+        return handle
+
+    def _query(self, query, index):
+        index = self.device_index if index is None else index
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    return query(self._module(), self._handle(index))
+                except ImportError:
+                    return None
+                except Exception:
+                    # Stale session or handle (driver reload, GPU reset...): start over once
+                    self._shutdown()
+            return None
+
+    def get_temp(self, index=None):
+        return self._query(lambda nvml, handle: nvml.nvmlDeviceGetTemperature(handle, nvml.NVML_TEMPERATURE_GPU), index)
+
+    def get_usage(self, index=None):
+        return self._query(lambda nvml, handle: int(nvml.nvmlDeviceGetUtilizationRates(handle).gpu), index)
+
+    def _shutdown(self):
+        if self._initialized:
+            self._initialized = False
+            self._handles = {}
+            try:
+                self._module().nvmlShutdown()
+            except Exception:
+                pass
+
+    def shutdown(self):
+        with self._lock:
+            self._shutdown()
@@ -0,0 +1,48 @@
+import numpy as np
+
+REPORT_SIZE = 64
+
+
+class PacketEncoder:
+    """
+    Builds the HID reports for a frame directly in one preallocated buffer.
+    The first report is the header followed by the start of the RGB payload,
+    the following ones are a 0x00 report ID followed by up to 64 payload bytes.
+    """
+    def __init__(self, number_of_leds, header):
+        self.number_of_leds = number_of_leds
+        self.header = bytes(header)
+        payload_size = number_of_leds * 3
+        first_size = REPORT_SIZE - len(header)
+
+        sizes = [len(header) + first_size]
+        positions = list(range(len(header), len(header) + first_size))
+        offset = sizes[0]
+        remaining = payload_size - first_size
+        while remaining > 0:
+            chunk = min(REPORT_SIZE, remaining)
+            positions.extend(range(offset + 1, offset + 1 + chunk))
+            sizes.append(1 + chunk)
+            offset += 1 + chunk
+            remaining -= chunk
+
+        # The header and the report IDs never change, only the payload bytes are rewritten
+        self.buffer = bytearray(offset)
+        self.buffer[:len(header)] = header
+        self._view = np.frombuffer(self.buffer, dtype=np.uint8)
+        self._payload_positions = np.array(positions[:payload_size], dtype=np.intp)
+        view = memoryview(self.buffer)
+        self.reports = []
+        start = 0
+        for size in sizes:
+            self.reports.append(view[start:start + size])
+            start += size
+
+    def encode(self, frame):
+        """Writes an (number_of_leds, 3) uint8 frame into the buffer and returns the reports."""
+        self._view[self._payload_positions] = frame.reshape(-1)
+        return self.reports
+
+    def decode(self, buffer):
+        """The (number_of_leds, 3) uint8 frame encoded in buffer, e.g. a frame published by the controller."""
+        return np.frombuffer(buffer, dtype=np.uint8)[self._payload_positions].reshape(self.number_of_leds, 3)
@@ -0,0 +1,60 @@
+import json
+import os
+import platform
+import socket
+
+
+def get_cache_path():
+    default_dir = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'digital_thermal_right_lcd')
+    return os.environ.get('DIGITAL_LCD_PROBE_CACHE', os.path.join(default_dir, 'probe_cache.json'))
+
+
+def _driver_version(module):
+    for name in ('version', 'srcversion'):
+        try:
+            with open(f'/sys/module/{module}/{name}', 'r') as f:
+                return f.read().strip()
+        except OSError:
+            continue
+    return None
+
+
+def get_fingerprint(gpu_vendor):
+    """
+    Identifies the machine, kernel and GPU drivers the probe results are valid for.
+    Any change (new kernel, driver update, other vendor in config) is a cache miss.
+    """
+    uname = platform.uname()
+    return "|".join([
+        socket.gethostname(),
+        uname.system,
+        uname.release,
+        uname.machine,
+        gpu_vendor,
+        f"nvidia={_driver_version('nvidia')}",
+        f"amdgpu={_driver_version('amdgpu')}",
+    ])
+
+
+def load(fingerprint, path=None):
+    """Returns the cached {metric: candidate name} for this fingerprint, or {}."""
+    try:
+        with open(path or get_cache_path(), 'r') as f:
+            entry = json.load(f)
+        if entry.get('fingerprint') == fingerprint:
+            return dict(entry.get('backends', {}))
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {}
+
+
+def save(fingerprint, backends, path=None):
+    path = path or get_cache_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'fingerprint': fingerprint, 'backends': backends}, f, indent=4)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not write sensor probe cache {path}: {e}")
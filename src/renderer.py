@@ -0,0 +1,117 @@
+import numpy as np
+from config import NUMBER_OF_LEDS, display_modes, display_modes_small
+from color_plan import ColorPlan
+from display_modes import compile_display_mode
+from layout import get_index_table, get_layout_path, load_layout
+
+# Config keys the frames do not depend on, a config that only changes them keeps its renderer
+controller_keys = {
+    "update_interval", "metrics_update_interval", "metrics_update_intervals", "keepalive_interval",
+    "idle_mode", "device_backend", "capture_file", "vendor_id", "gpu_vendor",
+}
+
+class Renderer:
+    """
+    Everything that turns a config into frames: color plans, LED index table, layout file and
+    display mode are built once per config, frame() then only draws a metrics snapshot at
+    animation time t. The controller and the UI preview both render through it, so the
+    preview shows what the device gets. The color plans of previous, the renderer of the
+    previous config, are reused when their colors did not change.
+    """
+    def __init__(self, config, previous=None):
+        self.color_plans = previous.color_plans if previous is not None else {}
+        if config:
+            product_id = int(config.get('product_id', "0x8001"),16)
+            self.metrics_max_value = {
+                "cpu_temp": config.get('cpu_max_temp', 90),
+                "gpu_temp": config.get('gpu_max_temp', 90),
+                "cpu_usage": config.get('cpu_max_usage', 100),
+                "gpu_usage": config.get('gpu_max_usage', 100),
+            }
+            self.metrics_min_value = {
+                "cpu_temp": config.get('cpu_min_temp', 30),
+                "gpu_temp": config.get('gpu_min_temp', 30),
+                "cpu_usage": config.get('cpu_min_usage', 0),
+                "gpu_usage": config.get('gpu_min_usage', 0),
+            }
+            display_mode = config.get('display_mode', 'metrics')
+
+            # Handle legacy dual_metrics mode
+            if display_mode == 'dual_metrics':
+                display_mode = 'peerless_standard'
+
+            self.temp_unit = {device: config.get(f"{device}_temperature_unit", "celsius") for device in ["cpu", "gpu"]}
+            self.cycle_duration = config.get('cycle_duration', 5)
+            self.color_plans = {key: self.compile_color_plan(config, key) for key in ("metrics", "time")}
+            self.layout = load_layout(get_layout_path(config, product_id))
+            if config.get('layout_mode', 'big')== 'small':
+                self.leds_indexes = get_index_table("small")
+                if display_mode not in display_modes_small:
+                    print(f"Warning: Display mode {display_mode} not compatible with small layout, switching to alternate metrics.")
+                    display_mode = "alternate_metrics"
+            else:
+                self.leds_indexes = get_index_table("big")
+                if display_mode not in display_modes:
+                    print(f"Warning: Display mode {display_mode} not compatible with big layout, switching to metrics.")
+                    display_mode = "metrics"
+        else:
+            product_id = 0x8001
+            self.metrics_max_value = {
+                "cpu_temp": 90,
+                "gpu_temp": 90,
+                "cpu_usage": 100,
+                "gpu_usage": 100,
+            }
+            self.metrics_min_value = {
+                "cpu_temp": 30,
+                "gpu_temp": 30,
+                "cpu_usage": 0,
+                "gpu_usage": 0,
+            }
+            display_mode = 'metrics'
+            self.temp_unit = {"cpu": "celsius", "gpu": "celsius"}
+            self.cycle_duration = 5
+            self.color_plans = {
+                "metrics": ColorPlan(["ff0000"] * NUMBER_OF_LEDS, self.metrics_min_value, self.metrics_max_value),
+                "time": ColorPlan(["ffe000"] * NUMBER_OF_LEDS, self.metrics_min_value, self.metrics_max_value),
+            }
+            self.leds_indexes = get_index_table("big")
+            self.layout = load_layout(get_layout_path({}, product_id))
+
+        self.config = config or {}
+        self.display_mode = display_mode
+        self.mode = compile_display_mode(display_mode, self.config, self.leds_indexes, self.layout, self.color_plans, self.cycle_duration)
+        self.framebuffer = np.zeros((NUMBER_OF_LEDS, 3), dtype=np.uint8)
+
+    def compile_color_plan(self, config, key):
+        """The plan of the config colors for key, the current one if they did not change."""
+        conf_colors = config.get(key, {}).get('colors', ["ffe000"] * NUMBER_OF_LEDS)
+        plan = self.color_plans.get(key)
+        if plan is not None and plan.matches(conf_colors, self.metrics_min_value, self.metrics_max_value):
+            return plan
+        if len(conf_colors) != NUMBER_OF_LEDS:
+            print(f"Warning: config {key} colors length mismatch, using default colors.")
+            plan = ColorPlan(["ff0000"] * NUMBER_OF_LEDS, self.metrics_min_value, self.metrics_max_value)
+            # Keep the original specs so that the mismatch is not reported again on every reload
+            plan.specs = list(conf_colors)
+        else:
+            plan = ColorPlan(conf_colors, self.metrics_min_value, self.metrics_max_value)
+        return plan
+
+    def matches(self, config):
+        """Whether config renders the same frames as the config of this renderer."""
+        config = config or {}
+        keys = (set(config) | set(self.config)) - controller_keys
+        return all(config.get(key) == self.config.get(key) for key in keys)
+
+    def required_metrics(self):
+        return self.mode.required_metrics()
+
+    def frame(self, snapshot, t):
+        """
+        The (NUMBER_OF_LEDS, 3) uint8 RGB frame for the snapshot (metrics in the temp_unit
+        units) at animation time t in seconds. The array is reused by the next call.
+        """
+        leds, colors = self.mode.render(snapshot, t)
+        np.multiply(colors, leds[:, None], out=self.framebuffer)
+        return self.framebuffer
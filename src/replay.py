@@ -0,0 +1,70 @@
+import argparse
+import os
+import sys
+import time
+from devices import open_device, read_capture, compare_captures
+
+
+def replay(path, dev, max_speed=False):
+    """Writes the frames of a capture to dev, at their original pace unless max_speed. Returns (frames, seconds)."""
+    start = time.monotonic()
+    frames = 0
+    for timestamp, reports in read_capture(path):
+        if not max_speed:
+            delay = start + timestamp - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        dev.write_frame(reports)
+        frames += 1
+    return frames, time.monotonic() - start
+
+
+def capture_info(path):
+    frames = 0
+    duration = 0.0
+    for timestamp, reports in read_capture(path):
+        frames += 1
+        duration = timestamp
+    return {"frames": frames, "duration_s": round(duration, 3), "bytes": os.path.getsize(path)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replays a frame capture recorded with the record device backend.")
+    parser.add_argument("capture", help="Capture file")
+    parser.add_argument("--device", choices=["hid", "null"], default="hid",
+                        help="Device to stream to: the cooler (hid, default) or none (null)")
+    parser.add_argument("--vendor-id", default="0x0416", help="Vendor ID of the cooler (default 0x0416)")
+    parser.add_argument("--product-id", default="0x8001", help="Product ID of the cooler (default 0x8001)")
+    parser.add_argument("--max-speed", action="store_true", help="Write the frames as fast as possible instead of at their original pace")
+    parser.add_argument("--info", action="store_true", help="Only print the number of frames, duration and size of the capture")
+    parser.add_argument("--compare", metavar="CAPTURE",
+                        help="Only compare the frames with another capture, ignoring timing; exits with status 1 if they differ")
+    args = parser.parse_args()
+
+    try:
+        if args.info:
+            print(capture_info(args.capture))
+            return 0
+        if args.compare:
+            index = compare_captures(args.capture, args.compare)
+            if index is None:
+                print("Captures are identical.")
+                return 0
+            print(f"Captures differ from frame {index}.")
+            return 1
+        dev = open_device(args.device, int(args.vendor_id, 16), int(args.product_id, 16))
+        if dev is None:
+            return 1
+        try:
+            frames, seconds = replay(args.capture, dev, max_speed=args.max_speed)
+        finally:
+            dev.close()
+    except (OSError, ValueError) as e:
+        print(f"Error replaying capture: {e}")
+        return 1
+    print(f"Replayed {frames} frames in {seconds:.3f} s ({frames / seconds if seconds > 0 else 0:.1f} frames/s).")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+import json
+import time
+
+
+class RollingHistogram:
+    """The last `window` durations of one stage in a ring buffer, percentiles are only computed when asked."""
+    def __init__(self, window=1024):
+        self.samples = [0.0] * window
+        self.window = window
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.samples[self.count % self.window] = seconds
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def summary(self):
+        recent = sorted(self.samples[:min(self.count, self.window)])
+        if not recent:
+            return {"count": 0}
+        def percentile(p):
+            return recent[min(int(p / 100 * len(recent)), len(recent) - 1)] * 1000
+        return {
+            "count": self.count,
+            "p50_ms": round(percentile(50), 3),
+            "p95_ms": round(percentile(95), 3),
+            "p99_ms": round(percentile(99), 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class _Timer:
+    __slots__ = ("stats", "stage", "start")
+
+    def __init__(self, stats, stage):
+        self.stats = stats
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stats.record(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_null_timer = _NullTimer()
+
+
+class StageStats:
+    """
+    Per-stage durations of the hot paths (config, sampling per backend, colors, render,
+    encode, HID write...). Recording is a perf_counter() pair and a list store;
+    with enabled set to False timer() returns a shared no-op context manager.
+    """
+    def __init__(self, window=1024, enabled=True):
+        self.window = window
+        self.enabled = enabled
+        self.histograms = {}
+
+    def record(self, stage, seconds):
+        if not self.enabled:
+            return
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms.setdefault(stage, RollingHistogram(self.window))
+        histogram.add(seconds)
+
+    def timer(self, stage):
+        return _Timer(self, stage) if self.enabled else _null_timer
+
+    def summary(self):
+        return {stage: histogram.summary() for stage, histogram in sorted(self.histograms.items())}
+
+    def summary_line(self):
+        parts = []
+        for stage, summary in self.summary().items():
+            if summary["count"]:
+                parts.append(f"{stage} p50={summary['p50_ms']:.2f} p95={summary['p95_ms']:.2f} "
+                             f"p99={summary['p99_ms']:.2f} max={summary['max_ms']:.2f}")
+        return "Stage timings (ms): " + ("; ".join(parts) if parts else "no samples yet")
+
+    def dump(self, path, extra=None):
+        """Writes the summary, and extra entries, as JSON to path."""
+        data = {"time": time.time(), "stages": self.summary()}
+        if extra:
+            data.update(extra)
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=4)
+
+
+# Shared by the controller, the metrics sampler and the HID writer thread
+stage_stats = StageStats()
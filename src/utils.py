@@ -18,4 +18,14 @@ def interpolate_color(start_color: str, end_color: str, factor: float) -> str:
 
 def get_random_color():
     return (f"{np.random.randint(0, 256):02x}{np.random.randint(0, 256):02x}{np.random.randint(0, 256):02x}")
-                
\ No newline at end of file
+                
+
+def hex_to_rgb(color: str) -> tuple:
+    """Converts a 'rrggbb' hex string (with or without a leading '#') to an (r, g, b) tuple."""
+    color = color.lstrip('#')
+    return tuple(int(color[i:i+2], 16) for i in (0, 2, 4))
+
+def rgb_to_hex(colors) -> np.ndarray:
+    """Converts an (N, 3) uint8 array to an array of N 'rrggbb' hex strings."""
+    message = np.ascontiguousarray(colors, dtype=np.uint8).tobytes().hex()
+    return np.array([message[i:i+6] for i in range(0, len(message), 6)])
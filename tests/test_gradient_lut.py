@@ -0,0 +1,52 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from color_plan import ColorPlan
+from config import NUMBER_OF_LEDS
+from gradient_lut import METRIC_VALUE_LIMITS, metric_domain, metric_lut, stops_domain, stops_lut
+from utils import interpolate_color
+
+
+def metric_colors(min_temp, max_temp, value):
+    metrics_min_value = {"cpu_temp": min_temp, "gpu_temp": 30, "cpu_usage": 0, "gpu_usage": 0}
+    metrics_max_value = {"cpu_temp": max_temp, "gpu_temp": 90, "cpu_usage": 100, "gpu_usage": 100}
+    plan = ColorPlan(["0000ff-ff0000-cpu_temp"] * NUMBER_OF_LEDS, metrics_min_value, metrics_max_value)
+    return plan.evaluate({"cpu_temp": value}, 0.0, 5)
+
+
+def expected_color(min_temp, max_temp, value):
+    factor = max(0, min(1, (value - min_temp) / (max_temp - min_temp)))
+    return interpolate_color("0000ff", "ff0000", factor)
+
+
+def test_metric_gradient():
+    for value in (0, 30, 47, 90, 120):
+        colors = metric_colors(30, 90, value)
+        assert bytes(colors[0]).hex() == expected_color(30, 90, value)
+
+
+def test_inverted_metric_range_is_a_reversed_gradient():
+    for value in (0, 30, 47, 62, 95, 120):
+        colors = metric_colors(95, 30, value)
+        assert bytes(colors[0]).hex() == expected_color(95, 30, value)
+        assert (colors == colors[0]).all()
+
+
+def test_huge_metric_range_builds_a_small_table():
+    table = metric_lut((0, 255, 0), (255, 0, 0), 0, 10 ** 12)
+    low, high = metric_domain(0, 10 ** 12)
+    assert len(table) == high - low + 1 <= METRIC_VALUE_LIMITS[1] - METRIC_VALUE_LIMITS[0] + 1
+    for value in (0, 50, 999, 5000):
+        colors = metric_colors(0, 10 ** 12, value)
+        assert bytes(colors[0]).hex() == expected_color(0, 10 ** 12, min(value, METRIC_VALUE_LIMITS[1]))
+    assert metric_domain(float("-inf"), float("inf")) == METRIC_VALUE_LIMITS
+
+
+def test_huge_stops_range_builds_a_small_table():
+    stops = ((0, (0, 0, 255)), (50, (0, 255, 0)), (10 ** 12, (255, 0, 0)))
+    table = stops_lut(stops)
+    assert len(table) == stops_domain(stops)[1] - stops_domain(stops)[0] + 1
+    assert tuple(table[0]) == (0, 0, 255)
+    assert tuple(table[50]) == (0, 255, 0)
@@ -0,0 +1,61 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from hwmon_backend import HwmonBackend
+
+
+def write(root, path, value):
+    path = root / path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(f"{value}\n")
+
+
+def add_hwmon(root, index, name, temps, busy=None):
+    """temps is [(label, millidegrees)], a None label leaves the sensor without a label file."""
+    directory = f"class/hwmon/hwmon{index}"
+    write(root, f"{directory}/name", name)
+    for i, (label, value) in enumerate(temps, start=1):
+        if label is not None:
+            write(root, f"{directory}/temp{i}_label", label)
+        write(root, f"{directory}/temp{i}_input", value)
+    if busy is not None:
+        write(root, f"{directory}/device/gpu_busy_percent", busy)
+
+
+def test_k10temp_tctl_and_amdgpu(tmp_path):
+    add_hwmon(tmp_path, 0, "acpitz", [(None, 30000)])
+    add_hwmon(tmp_path, 2, "amdgpu", [("edge", 48000), ("junction", 61000)], busy=23)
+    add_hwmon(tmp_path, 10, "k10temp", [("Tccd1", 50000), ("Tctl", 55500)])
+    backend = HwmonBackend(sysfs_root=str(tmp_path))
+    try:
+        assert backend.get_cpu_temp() == 55.5
+        assert backend.get_gpu_temp() == 48.0
+        assert backend.get_gpu_usage() == 23
+        # Kept open, each read sees the current value
+        write(tmp_path, "class/hwmon/hwmon2/device/gpu_busy_percent", 97)
+        assert backend.get_gpu_usage() == 97
+    finally:
+        backend.close()
+    backend = HwmonBackend(sysfs_root=str(tmp_path), amd_gpu_temp_sensor="junction")
+    assert backend.get_gpu_temp() == 61.0
+    backend.close()
+
+
+def test_coretemp_package(tmp_path):
+    add_hwmon(tmp_path, 1, "coretemp", [("Core 0", 40000), ("Package id 0", 45000)])
+    backend = HwmonBackend(sysfs_root=str(tmp_path))
+    assert backend.get_cpu_temp() == 45.0
+    # No AMD GPU
+    assert backend.get_gpu_temp() is None and backend.get_gpu_usage() is None
+    backend.close()
+
+
+def test_thermal_zone0_fallback(tmp_path):
+    add_hwmon(tmp_path, 0, "nvme", [("Composite", 35000)])
+    write(tmp_path, "class/thermal/thermal_zone0/temp", 42000)
+    backend = HwmonBackend(sysfs_root=str(tmp_path))
+    assert backend.get_cpu_temp() == 42.0
+    backend.close()
+    assert HwmonBackend(sysfs_root=str(tmp_path / "missing")).get_cpu_temp() is None
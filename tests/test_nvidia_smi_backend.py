@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from nvidia_smi_backend import NvidiaSmiStream
+
+# Stands in for nvidia-smi: prints a few lines like `--format=csv,noheader` and exits,
+# with a temperature that goes up by one on each run (counted in the file given as argument).
+# The first run stays up a moment, so that its value can be read before the restart.
+FAKE_NVIDIA_SMI = """
+import sys
+import time
+path = sys.argv[1]
+try:
+    runs = int(open(path).read())
+except (OSError, ValueError):
+    runs = 0
+open(path, "w").write(str(runs + 1))
+print("[N/A], [N/A]", flush=True)
+print("garbage", flush=True)
+print(f"{50 + runs}, 37 %", flush=True)
+if runs == 0:
+    time.sleep(0.5)
+"""
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_parse_line():
+    stream = NvidiaSmiStream()
+    stream.parse_line("[Not Supported], 12 %")
+    assert stream.last_sample_time is None
+    stream.parse_line("61, 12 %\n")
+    assert (stream.temp, stream.usage) == (61, 12)
+
+
+def test_reads_and_restarts_the_process(tmp_path):
+    script = tmp_path / "nvidia-smi.py"
+    script.write_text(FAKE_NVIDIA_SMI)
+    stream = NvidiaSmiStream(command=[sys.executable, str(script), str(tmp_path / "runs")], restart_delay=0.05)
+    try:
+        assert stream.get_temp() == 50
+        assert stream.get_usage() == 37
+        wait_for(lambda: stream.restarts >= 1 and stream.temp > 50)
+        assert stream.get_temp() > 50
+    finally:
+        stream.stop()
@@ -0,0 +1,67 @@
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from nvml_backend import NvmlBackend
+
+
+class FakePynvml:
+    """Counts the NVML calls, and fails the next queries while failures is positive."""
+    NVML_TEMPERATURE_GPU = 0
+
+    def __init__(self):
+        self.inits = 0
+        self.shutdowns = 0
+        self.handle_lookups = 0
+        self.failures = 0
+
+    def nvmlInit(self):
+        self.inits += 1
+
+    def nvmlShutdown(self):
+        self.shutdowns += 1
+
+    def nvmlDeviceGetHandleByIndex(self, index):
+        self.handle_lookups += 1
+        return ("handle", index, self.inits)
+
+    def _check(self, handle):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("GPU is lost")
+        assert handle[2] == self.inits, "handle of a previous session"
+
+    def nvmlDeviceGetTemperature(self, handle, sensor):
+        self._check(handle)
+        return 55
+
+    def nvmlDeviceGetUtilizationRates(self, handle):
+        self._check(handle)
+        return SimpleNamespace(gpu=37.0)
+
+
+def test_session_and_handle_are_reused():
+    nvml = FakePynvml()
+    backend = NvmlBackend(pynvml=nvml)
+    for _ in range(3):
+        assert backend.get_temp() == 55
+        assert backend.get_usage() == 37
+    assert (nvml.inits, nvml.handle_lookups, nvml.shutdowns) == (1, 1, 0)
+    backend.shutdown()
+    assert nvml.shutdowns == 1
+
+
+def test_reinit_after_an_error():
+    nvml = FakePynvml()
+    backend = NvmlBackend(pynvml=nvml)
+    assert backend.get_temp() == 55
+    nvml.failures = 1
+    assert backend.get_temp() == 55
+    assert (nvml.inits, nvml.handle_lookups, nvml.shutdowns) == (2, 2, 1)
+    # Still failing after the new session: no value, and the next query starts over again
+    nvml.failures = 2
+    assert backend.get_usage() is None
+    assert backend.get_usage() == 37
+    assert nvml.inits == 4